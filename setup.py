@@ -134,5 +134,9 @@ setup(
         "Natural Language :: English",
         "Programming Language :: Python :: 3",
     ],
-    entry_points={"lms.djangoapp": ["shoppingcart = shoppingcart.apps:AppsemblerApiConfig"]},
+    entry_points={
+        "lms.djangoapp": ["shoppingcart = shoppingcart.apps:AppsemblerApiConfig"],
+        # Studio sends the course_published signal that invalidates the cached course data
+        "cms.djangoapp": ["shoppingcart = shoppingcart.apps:AppsemblerApiConfig"],
+    },
 )
@@ -21,3 +21,6 @@ class AppsemblerApiConfig(AppConfig):
             }
         },
     }
+
+    def ready(self):
+        from . import signals  # pylint: disable=import-outside-toplevel,unused-import
@@ -0,0 +1,89 @@
+"""
+Cached course data of appsembler_api, and its invalidation.
+
+This module only depends on Django, so the course_published handler can drop the shared Django
+cache entries from Studio, where the LMS modules used by the API are not available.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+COURSE_SEARCH_GENERATION_KEY = "appsembler_api.course_search.generation"
+
+
+class LocalTTLCache:
+    """
+    A small thread-safe, process-local LRU cache whose entries expire after a timeout.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+course_redemption_info_cache = LocalTTLCache(
+    maxsize=getattr(settings, "APPSEMBLER_API_COURSE_LOCAL_CACHE_SIZE", 256),
+    timeout=getattr(settings, "APPSEMBLER_API_COURSE_LOCAL_CACHE_TIMEOUT", 60),
+)
+
+
+def course_redemption_info_cache_key(course_key):
+    return "appsembler_api.course_redemption_info.{}".format(course_key)
+
+
+def invalidate_course_redemption_info(course_key):
+    """
+    Drop the cached redemption info of a course.
+
+    The process-local entry is only dropped in the current process, the ones of the other
+    processes expire after APPSEMBLER_API_COURSE_LOCAL_CACHE_TIMEOUT seconds.
+    """
+    cache_key = course_redemption_info_cache_key(course_key)
+    course_redemption_info_cache.delete(cache_key)
+    cache.delete(cache_key)
+
+
+def invalidate_course_search_cache():
+    """
+    Make every cached course search stale, by moving on to a new cache key generation.
+    """
+    try:
+        cache.incr(COURSE_SEARCH_GENERATION_KEY)
+    except ValueError:
+        cache.set(COURSE_SEARCH_GENERATION_KEY, 1, None)
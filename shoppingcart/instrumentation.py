@@ -0,0 +1,134 @@
+"""
+Opt-in per-request instrumentation of the appsembler_api views.
+
+Enable it with the APPSEMBLER_API_INSTRUMENTATION setting. While it is disabled, instrumented
+views and timed sections only cost a setting lookup and a thread-local lookup.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from edx_django_utils.monitoring import set_custom_attribute
+
+log = logging.getLogger(__name__)
+
+_current = threading.local()
+
+
+class RequestTimings:
+    """
+    The database queries and the timed sections of one instrumented request.
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self.query_duration = 0.0
+        # section name: (count, duration)
+        self.sections = OrderedDict()
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper counting and timing the queries.
+        """
+        # the arguments are the ones Django passes to execute wrappers
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_count += 1
+            self.query_duration += time.perf_counter() - start
+
+    def add(self, name, duration):
+        count, total = self.sections.get(name, (0, 0.0))
+        self.sections[name] = (count + 1, total + duration)
+
+    def as_list(self):
+        """
+        Return a (name, count, duration) tuple for the queries and every timed section.
+        """
+        return [("db", self.query_count, self.query_duration)] + [
+            (name, count, duration) for name, (count, duration) in self.sections.items()
+        ]
+
+
+@contextmanager
+def timed(name):
+    """
+    Time the enclosed code, e.g. a call to the modulestore or the search engine,
+    as the `name` section of the current instrumented request, if any.
+
+    Can also be used as a function decorator.
+    """
+    timings = getattr(_current, "timings", None)
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+class InstrumentedViewMixin:
+    """
+    Report the database queries, the timed sections and the rendering time of a view's requests,
+    when the APPSEMBLER_API_INSTRUMENTATION setting is enabled.
+
+    They are reported as a Server-Timing response header, a JSON log line and custom monitoring
+    attributes. Queries run in other threads, or while a streamed response is sent, are not counted.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if not getattr(settings, "APPSEMBLER_API_INSTRUMENTATION", False):
+            return super().dispatch(request, *args, **kwargs)
+
+        timings = RequestTimings()
+        _current.timings = timings
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timings.record_query):
+                response = super().dispatch(request, *args, **kwargs)
+                if not response.streaming and hasattr(response, "render"):
+                    with timed("render"):
+                        response.render()
+        finally:
+            _current.timings = None
+        report_timings(self.__class__.__name__, timings, time.perf_counter() - start, response)
+        return response
+
+
+def report_timings(view_name, timings, total_duration, response):
+    """
+    Add the Server-Timing header to the response, and log and monitor the timings of a request.
+    """
+    measures = timings.as_list()
+    response["Server-Timing"] = ", ".join(
+        ['{};dur={:.1f};desc="{} calls"'.format(name, duration * 1000, count) for name, count, duration in measures]
+        + ["total;dur={:.1f}".format(total_duration * 1000)]
+    )
+
+    log.info(
+        "appsembler_api timings: %s",
+        json.dumps(
+            {
+                "view": view_name,
+                "status": response.status_code,
+                "total_ms": round(total_duration * 1000, 1),
+                "sections": {
+                    name: {"count": count, "duration_ms": round(duration * 1000, 1)}
+                    for name, count, duration in measures
+                },
+            }
+        ),
+    )
+    for name, count, duration in measures:
+        set_custom_attribute("appsembler_api.{}.count".format(name), count)
+        set_custom_attribute("appsembler_api.{}.duration_ms".format(name), round(duration * 1000, 1))
@@ -0,0 +1,336 @@
+"""
+Benchmark the appsembler_api endpoints.
+
+Seeds users, enrollments, certificates, enrollment codes and users to redeem them, calls every endpoint and reports its
+query count, wall time and peak Python memory. Everything runs in one transaction that is rolled
+back at the end, so the database is left as it was.
+
+Runs in an LMS with the plugin installed, e.g. in a tutor dev environment:
+
+    ./manage.py lms appsembler_api_benchmark --course-id course-v1:OpenedX+DemoX+DemoCourse --users 1000 \
+        --baseline /tmp/appsembler_api_benchmark.json --save-baseline
+
+Then, after a change, run the same command without --save-baseline: it fails if an endpoint returns
+another status code or runs more queries than its baseline, or is slower or uses more memory than
+the baseline plus the tolerance.
+"""
+
+import json
+import secrets
+import time
+import tracemalloc
+from functools import partial
+
+from common.djangoapps.student.models import CourseEnrollment, UserProfile
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from lms.djangoapps.certificates.models import GeneratedCertificate
+from opaque_keys.edx.keys import CourseKey
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+from rest_framework.test import APIClient
+
+from shoppingcart.models import BulkEnrollmentJob, CourseRegistrationCode
+
+User = auth.get_user_model()
+
+# the number of users used by the endpoints taking a list of users
+BULK_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = "Benchmark the query count, wall time and peak memory of every appsembler_api endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course-id", required=True, help="An existing course to enroll the seeded users in.")
+        parser.add_argument("--users", type=int, default=1000, help="Users to seed, all enrolled in the course.")
+        parser.add_argument("--certificates", type=int, default=500, help="Certificates to seed, one per user.")
+        parser.add_argument("--codes", type=int, default=1000, help="Enrollment codes to seed.")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed calls per endpoint, the fastest is kept.")
+        parser.add_argument("--baseline", help="JSON file with the baseline results to compare to.")
+        parser.add_argument(
+            "--save-baseline", action="store_true", help="Save the results to the baseline file instead of comparing."
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed relative increase of the wall time and peak memory over the baseline.",
+        )
+
+    def handle(self, *args, **options):
+        course_key = CourseKey.from_string(options["course_id"])
+        if not CourseOverview.objects.filter(id=course_key).exists():
+            raise CommandError("Course {} not found".format(course_key))
+        if not 1 <= options["repeat"] < BULK_SIZE:
+            raise CommandError("--repeat must be between 1 and {}".format(BULK_SIZE - 1))
+        if options["users"] < BULK_SIZE:
+            raise CommandError("--users must be at least {}".format(BULK_SIZE))
+        # every call redeeming enrollment codes uses new codes, including the memory tracing call
+        if options["codes"] < BULK_SIZE * (options["repeat"] + 2):
+            raise CommandError(
+                "--codes must be at least {} with --repeat {}".format(
+                    BULK_SIZE * (options["repeat"] + 2), options["repeat"]
+                )
+            )
+        if options["save_baseline"] and not options["baseline"]:
+            raise CommandError("--save-baseline requires --baseline")
+
+        # the enrollment code endpoints are rate limited, and every endpoint is called several times
+        with override_settings(RATELIMIT_ENABLE=False), transaction.atomic():
+            seed = self._seed(course_key, options)
+            client = APIClient(HTTP_HOST=settings.SITE_NAME)
+            client.force_authenticate(user=seed["staff"])
+            results = {}
+            for name, method, kwargs, get_data in self._get_endpoints(seed):
+                call = partial(self._call, client, method, reverse(name, kwargs=kwargs))
+                results[name] = self._benchmark(call, get_data, options["repeat"])
+                self.stdout.write(
+                    "{name}: status {status}, {queries} queries, {time:.3f}s, {peak_memory} bytes".format(
+                        name=name, **results[name]
+                    )
+                )
+            transaction.set_rollback(True)
+
+        if options["save_baseline"]:
+            with open(options["baseline"], "w", encoding="utf-8") as baseline_file:
+                json.dump(results, baseline_file, indent=2, sort_keys=True)
+            self.stdout.write("Baseline saved to {}".format(options["baseline"]))
+        elif options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = self._get_regressions(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError("Performance regressions:\n" + "\n".join(regressions))
+            self.stdout.write("No regression against {}".format(options["baseline"]))
+
+    def _seed(self, course_key, options):
+        """
+        Create the staff user, users, profiles, enrollments, certificates, enrollment codes and bulk enrollment
+        job used by the endpoints.
+
+        The users redeeming enrollment codes are not enrolled in the course, so every redemption is a new
+        enrollment: each call gets its own users, including the memory tracing call.
+        """
+        prefix = "bench{}".format(secrets.token_hex(4))
+        password = make_password(None)
+        staff = User.objects.create(username=prefix, email="{}@example.com".format(prefix), is_staff=True)
+        usernames = ["{}_{}".format(prefix, index) for index in range(options["users"])]
+        redeeming_usernames = [
+            "{}r_{}".format(prefix, index) for index in range((BULK_SIZE + 1) * (options["repeat"] + 1))
+        ]
+        User.objects.bulk_create(
+            User(username=username, email="{}@example.com".format(username), password=password)
+            for username in usernames + redeeming_usernames
+        )
+        # bulk_create does not set the primary keys on every database
+        users = list(User.objects.filter(username__startswith=prefix + "_").order_by("id"))
+        redeeming_users = list(User.objects.filter(username__startswith=prefix + "r_").order_by("id"))
+        UserProfile.objects.bulk_create(UserProfile(user=user, name=user.username) for user in users + redeeming_users)
+        CourseEnrollment.objects.bulk_create(
+            CourseEnrollment(user=user, course_id=course_key, mode="audit", is_active=True) for user in users
+        )
+        GeneratedCertificate.objects.bulk_create(
+            GeneratedCertificate(user=user, course_id=course_key, mode="audit", status="downloadable")
+            for user in users[: options["certificates"]]
+        )
+        CourseRegistrationCode.objects.bulk_create(
+            CourseRegistrationCode(
+                code="{}{}".format(prefix, index), course_id=course_key, created_by=staff, mode_slug="audit"
+            )
+            for index in range(options["codes"])
+        )
+        job = BulkEnrollmentJob.objects.create(
+            created_by=staff,
+            parameters={"identifiers": staff.email, "courses": [str(course_key)], "action": "enroll"},
+        )
+        return {
+            "prefix": prefix,
+            "staff": staff,
+            "users": users,
+            "redeeming_emails": [user.email for user in redeeming_users],
+            "course_id": str(course_key),
+            "codes": ["{}{}".format(prefix, index) for index in range(options["codes"])],
+            "job": job,
+        }
+
+    @staticmethod
+    def _get_endpoints(seed):
+        """
+        Return a (url name, method, url kwargs, data) tuple for every endpoint.
+
+        The data is a function of the call number, so that the endpoints creating accounts or
+        redeeming enrollment codes get new data on every call.
+        """
+        prefix = seed["prefix"]
+        course_id = seed["course_id"]
+        usernames = [user.username for user in seed["users"][:BULK_SIZE]]
+        emails = [user.email for user in seed["users"][:BULK_SIZE]]
+        codes = seed["codes"]
+        # the batch redemption calls take the first redeeming users, the single redemption calls the last ones
+        redeeming_emails = seed["redeeming_emails"]
+
+        def new_account(name):
+            return {
+                "username": "{}_{}".format(prefix, name),
+                "password": secrets.token_urlsafe(16),
+                "email": "{}_{}@example.com".format(prefix, name),
+                "name": name,
+                "send_activation_email": "False",
+            }
+
+        # the login_session endpoint is the edx-platform login view, so it is not benchmarked here
+        return [
+            ("appsembler_api:create_user_account_api", "post", {}, lambda run: new_account("create{}".format(run))),
+            (
+                "appsembler_api:create_user_account_without_password_api",
+                "post",
+                {},
+                lambda run: {"email": "{}_nopassword{}@example.com".format(prefix, run), "name": "nopassword"},
+            ),
+            (
+                "appsembler_api:bulk_create_user_account_api",
+                "post",
+                {},
+                lambda run: {"accounts": [new_account("bulk{}x{}".format(run, index)) for index in range(BULK_SIZE)]},
+            ),
+            (
+                "appsembler_api:user_account_connect_api",
+                "post",
+                {},
+                lambda run: {"username": usernames[0], "name": "connect"},
+            ),
+            (
+                "appsembler_api:user_account_update_user",
+                "post",
+                {},
+                lambda run: {"user_lookup": usernames[0], "country": "US", "bio": "run {}".format(run)},
+            ),
+            (
+                "appsembler_api:user_account_bulk_update_user",
+                "post",
+                {},
+                lambda run: {
+                    "users": [{"user_lookup": username, "bio": "run {}".format(run)} for username in usernames]
+                },
+            ),
+            (
+                "appsembler_api:get_user_accounts_api",
+                "post",
+                {},
+                lambda run: {"usernames": usernames, "emails": emails},
+            ),
+            ("appsembler_api:get_user_account_api", "get", {"username": usernames[0]}, lambda run: None),
+            ("appsembler_api:course_list_search", "get", {}, lambda run: {"search_term": "course"}),
+            (
+                "appsembler_api:bulk_enrollment_api",
+                "post",
+                {},
+                lambda run: {"identifiers": ",".join(emails), "courses": course_id, "action": "enroll"},
+            ),
+            ("appsembler_api:bulk_enrollment_job_api", "get", {"job_id": seed["job"].id}, lambda run: None),
+            (
+                "appsembler_api:generate_registration_codes_api",
+                "post",
+                {},
+                lambda run: {"course_id": course_id, "total_registration_codes": BULK_SIZE},
+            ),
+            (
+                "appsembler_api:enroll_use_with_code_api",
+                "post",
+                {},
+                lambda run: {"enrollment_code": codes[run], "email": redeeming_emails[-1 - run]},
+            ),
+            (
+                "appsembler_api:batch_enroll_users_with_codes_api",
+                "post",
+                {},
+                lambda run: {
+                    "items": [
+                        {"email": email, "enrollment_code": code}
+                        for email, code in zip(
+                            redeeming_emails[BULK_SIZE * run : BULK_SIZE * (run + 1)], codes[BULK_SIZE * (run + 1) :]
+                        )
+                    ]
+                },
+            ),
+            (
+                "appsembler_api:enrollment_code_status_api",
+                "post",
+                {},
+                lambda run: {"enrollment_code": codes[0], "action": "cancel" if run % 2 else "restore"},
+            ),
+            ("appsembler_api:get_batch_user_data", "get", {}, lambda run: {"updated_min": "2000-01-01"}),
+            ("appsembler_api:get_batch_enrollment_data", "get", {}, lambda run: {"course_id": course_id}),
+        ]
+
+    @staticmethod
+    def _call(client, method, url, data):
+        """
+        Call an endpoint and read its whole response, including streamed content.
+        """
+        if method == "get":
+            response = client.get(url, data)
+        else:
+            response = client.post(url, data, format="json")
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    @staticmethod
+    def _benchmark(call, get_data, repeat):
+        """
+        Return the status code, query count, fastest wall time and peak memory of an endpoint.
+
+        `call` calls the endpoint with the given data, and `get_data` returns the data of a call number.
+
+        The query count is the one of the last timed call, once the caches are warm. Memory is
+        traced in an extra call, so that tracing does not slow down the timed calls.
+        """
+        best_time = None
+        for run in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = call(get_data(run))
+                elapsed = time.perf_counter() - start
+            best_time = elapsed if best_time is None else min(best_time, elapsed)
+
+        tracemalloc.start()
+        try:
+            call(get_data(repeat))
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "status": response.status_code,
+            "queries": len(queries),
+            "time": best_time,
+            "peak_memory": peak_memory,
+        }
+
+    @staticmethod
+    def _get_regressions(results, baseline, tolerance):
+        """
+        Return a description of every measure that regressed past the baseline.
+        """
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if result["status"] != expected["status"]:
+                regressions.append("{}: status {} instead of {}".format(name, result["status"], expected["status"]))
+            if result["queries"] > expected["queries"]:
+                regressions.append("{}: {} queries instead of {}".format(name, result["queries"], expected["queries"]))
+            for measure in ("time", "peak_memory"):
+                if result[measure] > expected[measure] * (1 + tolerance):
+                    regressions.append(
+                        "{}: {} {} instead of {}".format(name, measure, result[measure], expected[measure])
+                    )
+        return regressions
@@ -4,6 +4,7 @@ Database models for appsembler_api.
 
 from common.djangoapps.student.models import CourseEnrollment
 from django.contrib import auth
+from django.contrib.sites.models import Site
 from django.db import models
 from opaque_keys.edx.django.models import CourseKeyField
 
@@ -79,3 +80,44 @@ class RegistrationCodeRedemption(models.Model):
         code_redemption = RegistrationCodeRedemption(registration_code=course_reg_code, redeemed_by=user)
         code_redemption.save()
         return code_redemption
+
+
+class BulkEnrollmentJob(models.Model):
+    """
+    A bulk enrollment request that is run in the background.
+
+    .. pii: The parameters store the emails or usernames of the learners to enroll until the job finishes,
+       and the results store them until the job is deleted, APPSEMBLER_API_BULK_ENROLL_JOBS_RETENTION_DAYS
+       days after it finished.
+    .. pii_types: email_address, username
+    .. pii_retirement: retained
+    """
+
+    class Meta:
+        app_label = "shoppingcart"
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, PENDING),
+        (RUNNING, RUNNING),
+        (SUCCEEDED, SUCCEEDED),
+        (FAILED, FAILED),
+    )
+
+    created_by = models.ForeignKey(User, related_name="bulk_enrollment_jobs", on_delete=models.CASCADE)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    # the validated BulkEnrollmentSerializer data
+    parameters = models.JSONField()
+    # the students_update_enrollment results, keyed by course id
+    results = models.JSONField(default=dict)
+    error = models.TextField(blank=True, default="")
+    # the site, host and scheme of the request that created the job, so the job runs for the same site
+    site = models.ForeignKey(Site, null=True, related_name="+", on_delete=models.SET_NULL)
+    host = models.CharField(max_length=255, blank=True, default="")
+    is_secure = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
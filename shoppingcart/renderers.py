@@ -0,0 +1,80 @@
+"""
+Renderers for appsembler_api DRF API
+"""
+
+import csv
+import datetime
+import io
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class _Echo:
+    """
+    File-like object that returns what is written to it, for streaming csv output.
+    """
+
+    def write(self, value):
+        return value
+
+
+class JSONLinesRenderer(JSONRenderer):
+    """
+    Renders data as JSON Lines: one compact JSON document per line.
+
+    A list is rendered as one line per item.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "jsonl"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, list):
+            return b"".join(self.render(row) for row in data)
+        return super().render(data, accepted_media_type, renderer_context) + b"\n"
+
+    def stream(self, rows):
+        """
+        Yield each row of an iterable as an encoded line, for use with a StreamingHttpResponse.
+        """
+        for row in rows:
+            yield self.render(row)
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Renders a dict, or a list of dicts sharing the same keys, as CSV with a header row.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        if not rows:
+            return b""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(self._format_row(row) for row in rows)
+        return buffer.getvalue().encode(self.charset)
+
+    def stream(self, rows, fieldnames):
+        """
+        Yield the header and then each row of an iterable as an encoded CSV line,
+        for use with a StreamingHttpResponse.
+        """
+        writer = csv.DictWriter(_Echo(), fieldnames=fieldnames)
+        yield writer.writeheader().encode(self.charset)
+        for row in rows:
+            yield writer.writerow(self._format_row(row)).encode(self.charset)
+
+    @staticmethod
+    def _format_row(row):
+        return {
+            key: value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else value
+            for key, value in row.items()
+        }
@@ -0,0 +1,33 @@
+"""
+Signal handlers for appsembler_api.
+"""
+
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from xmodule.modulestore.django import SignalHandler
+
+from .caches import invalidate_course_redemption_info, invalidate_course_search_cache
+
+
+@receiver(SignalHandler.course_published)
+def invalidate_course_caches(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    """
+    Drop the cached course data when a course is published.
+
+    The signal is sent in Studio, which drops the entries of the Django cache it shares with the LMS.
+    """
+    invalidate_course_redemption_info(course_key)
+    invalidate_course_search_cache()
+
+
+@receiver(setting_changed)
+def reset_registration_extension_form(sender, setting, **kwargs):  # pylint: disable=unused-argument
+    """
+    Drop the resolved registration extension form when its setting is changed, e.g. by override_settings.
+    """
+    if setting == "REGISTRATION_EXTENSION_FORM":
+        # utils imports LMS modules, which Studio does not have
+        # pylint: disable=import-outside-toplevel
+        from .utils import reset_registration_extension_form_info
+
+        reset_registration_extension_form_info()
@@ -0,0 +1,98 @@
+"""
+Background tasks for appsembler_api.
+"""
+
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from crum import get_current_request, set_current_request
+from django.conf import settings
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from .models import BulkEnrollmentJob
+from .utils import update_course_enrollment
+
+log = logging.getLogger(__name__)
+
+
+@shared_task
+def run_bulk_enrollment_job(job_id):
+    """
+    Celery task running a saved BulkEnrollmentJob.
+    """
+    run_bulk_enrollment(BulkEnrollmentJob.objects.select_related("created_by", "site").get(id=job_id))
+
+
+def start_bulk_enrollment_job(job):
+    """
+    Schedule a saved BulkEnrollmentJob.
+
+    The job is sent to the Celery workers once the current transaction commits.
+    With the APPSEMBLER_API_BULK_ENROLL_JOBS_RUN_LOCALLY setting it is instead run right away
+    in the current process, which is meant for tests and environments without Celery workers.
+    """
+    if getattr(settings, "APPSEMBLER_API_BULK_ENROLL_JOBS_RUN_LOCALLY", False):
+        run_bulk_enrollment(job)
+    else:
+        transaction.on_commit(lambda: run_bulk_enrollment_job.delay(job.id))
+    delete_expired_bulk_enrollment_jobs()
+
+
+def delete_expired_bulk_enrollment_jobs():
+    """
+    Delete the jobs that finished more than APPSEMBLER_API_BULK_ENROLL_JOBS_RETENTION_DAYS days ago,
+    as their results hold the identifiers of the learners.
+    """
+    retention_days = getattr(settings, "APPSEMBLER_API_BULK_ENROLL_JOBS_RETENTION_DAYS", 30)
+    BulkEnrollmentJob.objects.filter(finished_at__lt=timezone.now() - timedelta(days=retention_days)).delete()
+
+
+def run_bulk_enrollment(job):
+    """
+    Enroll or unenroll the identifiers of a BulkEnrollmentJob course by course.
+
+    The results are saved after each course, so the job status endpoint can report progress.
+    The job runs for the site it was created on, and its identifiers are cleared once it finishes.
+    """
+    job.status = BulkEnrollmentJob.RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=["status", "started_at"])
+
+    parameters = job.parameters
+    request = RequestFactory().post(
+        "/",
+        data={
+            "identifiers": parameters["identifiers"],
+            "action": parameters["action"],
+            "auto_enroll": parameters["auto_enroll"],
+            "email_students": parameters["email_students"],
+        },
+        secure=job.is_secure if job.host else getattr(settings, "HTTPS", "on") == "on",
+        HTTP_HOST=job.host or settings.SITE_NAME,
+    )
+    request.user = job.created_by
+    if job.site is not None:
+        # set by CurrentSiteMiddleware on the LMS requests, and read by the site configuration helpers
+        request.site = job.site
+
+    # the site aware code, like the site configuration and the enrollment emails, reads the current request
+    previous_request = get_current_request()
+    set_current_request(request)
+    try:
+        for course in parameters["courses"]:
+            job.results[course] = update_course_enrollment(request, course)
+            job.save(update_fields=["results"])
+    except Exception as err:  # pylint: disable=broad-except
+        log.exception("Bulk enrollment job %s failed", job.id)
+        job.status = BulkEnrollmentJob.FAILED
+        job.error = str(err) or err.__class__.__name__
+    else:
+        job.status = BulkEnrollmentJob.SUCCEEDED
+    finally:
+        set_current_request(previous_request)
+    job.finished_at = timezone.now()
+    job.parameters = dict(parameters, identifiers="")
+    job.save(update_fields=["status", "error", "finished_at", "parameters"])
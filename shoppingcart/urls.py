@@ -24,6 +24,11 @@ urlpatterns = [
         transaction.non_atomic_requests(views.CreateUserAccountWithoutPasswordView.as_view()),
         name="create_user_account_without_password_api",
     ),
+    re_path(
+        r"^accounts/bulk_create",
+        transaction.non_atomic_requests(views.BulkCreateUserAccountView.as_view()),
+        name="bulk_create_user_account_api",
+    ),
     re_path(
         r"^accounts/create",
         transaction.non_atomic_requests(views.CreateUserAccountView.as_view()),
@@ -31,6 +36,10 @@ urlpatterns = [
     ),
     re_path(r"^accounts/connect", views.UserAccountConnect.as_view(), name="user_account_connect_api"),
     re_path(r"^accounts/update_user", views.UpdateUserAccount.as_view(), name="user_account_update_user"),
+    re_path(
+        r"^accounts/bulk_update_user", views.BulkUpdateUserAccounts.as_view(), name="user_account_bulk_update_user"
+    ),
+    re_path(r"^accounts/get-users", views.GetUserAccountsView.as_view(), name="get_user_accounts_api"),
     re_path(
         r"^accounts/get-user/(?P<username>[\w.+-]+)", views.GetUserAccountView.as_view(), name="get_user_account_api"
     ),
@@ -38,6 +47,9 @@ urlpatterns = [
     re_path(r"^search_courses", views.CourseListSearchView.as_view(), name="course_list_search"),
     # bulk enrollment API
     re_path(r"^bulk-enrollment/bulk-enroll", views.BulkEnrollView.as_view(), name="bulk_enrollment_api"),
+    re_path(
+        r"^bulk-enrollment/jobs/(?P<job_id>\d+)", views.BulkEnrollmentJobView.as_view(), name="bulk_enrollment_job_api"
+    ),
     # enrollment codes API
     re_path(
         r"^enrollment-codes/generate",
@@ -49,6 +61,11 @@ urlpatterns = [
         views.EnrollUserWithEnrollmentCodeView.as_view(),
         name="enroll_use_with_code_api",
     ),
+    re_path(
+        r"^enrollment-codes/batch-enroll",
+        views.BatchEnrollUsersWithEnrollmentCodesView.as_view(),
+        name="batch_enroll_users_with_codes_api",
+    ),
     re_path(r"^enrollment-codes/status", views.EnrollmentCodeStatusView.as_view(), name="enrollment_code_status_api"),
     # enrollment analytics API
     re_path(r"^analytics/accounts/batch", views.GetBatchUserDataView.as_view(), name="get_batch_user_data"),
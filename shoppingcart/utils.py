@@ -2,29 +2,61 @@
 utility functions for API classes.
 """
 
+import base64
+import functools
+import hashlib
+import heapq
+import itertools
+import json
 import logging
-import random
 import secrets
 import string
+from collections import namedtuple
 
+from common.djangoapps.course_modes.models import CourseMode
 from common.djangoapps.student.models import (
+    AlreadyEnrolledError,
+    CourseEnrollment,
+    CourseFullError,
+    EnrollmentClosedError,
     email_exists_or_retired,
+    is_email_retired,
+    is_username_retired,
     username_exists_or_retired,
 )
+from dateutil import parser
 from django.conf import settings
+from django.contrib import auth
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
 from django.db.utils import IntegrityError
 from django.http import Http404
+from edx_django_utils.monitoring import set_custom_attribute
+from lms.djangoapps.instructor.views.api import students_update_enrollment
 from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
 from openedx.core.djangoapps.user_authn.views.password_reset import (
     PasswordResetFormNoActive,
 )
+from openedx.core.djangoapps.user_authn.views.registration_form import (
+    get_registration_extension_form,
+)
+from openedx.core.lib.courses import get_course_by_id
 
+from .caches import (
+    COURSE_SEARCH_GENERATION_KEY,
+    course_redemption_info_cache,
+    course_redemption_info_cache_key,
+)
+from .instrumentation import timed
 from .models import CourseRegistrationCode, RegistrationCodeRedemption
 
+User = auth.get_user_model()
+
 AUDIT_LOG = logging.getLogger("audit")
+log = logging.getLogger(__name__)
 
 
 # source: https://github.com/appsembler/edx-platform/blob/appsembler/psu-temp-tahoe-juniper/openedx/core/djangoapps/appsembler/api/v1/api.py#L35-L55 pylint: disable=line-too-long
@@ -45,23 +77,53 @@ def account_exists(email, username):
     return email_exists or username_exists
 
 
+def account_is_retired(email, username):
+    """Check if either the email or the username belongs to a retired account
+
+    Either or both can be None. Unlike `account_exists`, the existing accounts are not looked up.
+    """
+    return bool(email and is_email_retired(email)) or bool(username and is_username_retired(username))
+
+
+def _iter_username_candidates(base_username):
+    """
+    Yield the base username, then the base username with a numeric suffix, from 3 digits up,
+    widening the suffix by one digit every time all the suffixes of a width are exhausted.
+    """
+    yield base_username
+    for digits in itertools.count(3):
+        for suffix in range(10 ** (digits - 1), 10**digits):
+            yield base_username + str(suffix)
+
+
 def auto_generate_username(email):
     """
-    This functions generates a valid username based on the email, also checks if
-    the username exists and adds a random 3 digit int at the end to warranty
-    uniqueness.
+    This functions generates a valid username based on the email. If the username
+    exists, the smallest free numeric suffix is added at the end to warranty uniqueness.
+
+    All the existing usernames starting with the same prefix are read in one query and the
+    free username is picked locally, so this always terminates after one query, plus a
+    retirement check of the picked username.
     """
     try:
         validate_email(email)
     except ValidationError:
         raise ValueError("Email is a invalid format")
 
-    username = "".join(e for e in email.split("@")[0] if e.isalnum())
-
-    while account_exists(username=username, email=None):
-        username = "".join(e for e in email.split("@")[0] if e.isalnum()) + str(random.randint(100, 999))
+    base_username = "".join(e for e in email.split("@")[0] if e.isalnum())
+    if not base_username:
+        return base_username
 
-    return username
+    # usernames are compared case-insensitively by the database collation
+    taken_usernames = {
+        username.lower()
+        for username in User.objects.filter(username__istartswith=base_username).values_list("username", flat=True)
+    }
+    return next(
+        username
+        for username in _iter_username_candidates(base_username)
+        if username.lower() not in taken_usernames and not is_username_retired(username)
+    )
 
 
 def send_activation_email(request):
@@ -80,19 +142,53 @@ def send_activation_email(request):
     return False
 
 
+RegistrationExtensionForm = namedtuple("RegistrationExtensionForm", ["field_names", "model"])
+
+
+@functools.lru_cache(maxsize=None)
+def get_registration_extension_form_info():
+    """
+    Return the field names and the model of the registration extension form, or None if there is none.
+
+    The form is resolved and instantiated once per process; call reset_registration_extension_form_info
+    after changing the REGISTRATION_EXTENSION_FORM setting.
+    """
+    custom_form = get_registration_extension_form()
+    if custom_form is None:
+        return None
+    return RegistrationExtensionForm(frozenset(custom_form.fields), custom_form.Meta.model)
+
+
+def reset_registration_extension_form_info():
+    """
+    Forget the registration extension form resolved by get_registration_extension_form_info.
+    """
+    get_registration_extension_form_info.cache_clear()
+
+
+def _registration_codes_with_redemption():
+    """
+    Return the CourseRegistrationCode queryset annotated with the id of each code's latest redemption, or None.
+    """
+    redemptions = RegistrationCodeRedemption.objects.filter(registration_code=OuterRef("pk")).order_by("-id")
+    return CourseRegistrationCode.objects.annotate(redemption_id=Subquery(redemptions.values("id")[:1]))
+
+
 def get_reg_code_validity(registration_code):
     """
     This function checks if the registration code is valid, and then checks if it was already redeemed.
+
+    Both are read with a single query.
     """
     reg_code_already_redeemed = False
     course_registration = None
     try:
-        course_registration = CourseRegistrationCode.objects.get(code=registration_code)
+        course_registration = _registration_codes_with_redemption().get(code=registration_code)
     except CourseRegistrationCode.DoesNotExist:
         reg_code_is_valid = False
     else:
         reg_code_is_valid = bool(course_registration.is_valid)
-        reg_code_already_redeemed = RegistrationCodeRedemption.is_registration_code_redeemed(registration_code)
+        reg_code_already_redeemed = course_registration.redemption_id is not None
     if not reg_code_is_valid:
         AUDIT_LOG.info("Redemption of a invalid RegistrationCode %s", registration_code)
         raise Http404()
@@ -100,6 +196,110 @@ def get_reg_code_validity(registration_code):
     return reg_code_is_valid, reg_code_already_redeemed, course_registration
 
 
+def get_reg_code_redemptions(registration_code):
+    """
+    Return the CourseRegistrationCode for a code, whether valid or not, and all its redemptions.
+
+    The code and whether it was redeemed are read with a single query. The redemptions, with their
+    course enrollment and user already loaded, are only queried when the code was redeemed.
+
+    Returns:
+        A (course_registration, redemptions) tuple; redemptions is empty if the code was not redeemed.
+
+    Raises:
+        CourseRegistrationCode.DoesNotExist: if there is no such code.
+    """
+    course_registration = _registration_codes_with_redemption().get(code=registration_code)
+    redemptions = []
+    if course_registration.redemption_id is not None:
+        redemptions = list(
+            RegistrationCodeRedemption.objects.select_related("course_enrollment__user").filter(
+                registration_code=course_registration
+            )
+        )
+    return course_registration, redemptions
+
+
+def get_course_redemption_info(course_key):
+    """
+    Return what code redemption needs to know about a course: {"course_id": ..., "mode_slugs": [...]}.
+
+    The result is cached in a process-local LRU cache (APPSEMBLER_API_COURSE_LOCAL_CACHE_TIMEOUT seconds),
+    in front of the Django cache (APPSEMBLER_API_COURSE_CACHE_TIMEOUT seconds), so the modulestore and
+    the course modes are not loaded on every redemption. See `caches.invalidate_course_redemption_info`.
+
+    Raises Http404 if the course does not exist.
+    """
+    cache_key = course_redemption_info_cache_key(course_key)
+    info = course_redemption_info_cache.get(cache_key)
+    if info is None:
+        info = cache.get(cache_key)
+        if info is None:
+            with timed("modulestore"):
+                course = get_course_by_id(course_key, depth=0)
+            info = {
+                "course_id": str(course.id),
+                "mode_slugs": [mode.slug for mode in CourseMode.modes_for_course(course.id)],
+            }
+            cache.set(cache_key, info, getattr(settings, "APPSEMBLER_API_COURSE_CACHE_TIMEOUT", 300))
+        course_redemption_info_cache.set(cache_key, info)
+    return info
+
+
+def get_course_search_cache_key(cleaned_data, effective_user, site):
+    """
+    Return the cache key of the search state of a CourseListGetAndSearchForm query.
+
+    The key is built from the normalized form data, so equivalent searches share it, from the
+    user the courses are listed for, as returned by `get_effective_user`: anonymous, or that specific
+    user, and from the current site, since the visible courses are filtered by the orgs of the site.
+    The caller must check the requesting user may list the courses of that user.
+    It also holds a generation number, bumped by `invalidate_course_search_cache`.
+    """
+    query = dict(cleaned_data)
+    query["search_term"] = " ".join((query.get("search_term") or "").lower().split())
+    query["username"] = None
+    query["visibility"] = "anonymous" if effective_user.is_anonymous else "user:{}".format(effective_user.id)
+    query["site"] = site.id if site else None
+    digest = hashlib.sha256(json.dumps(query, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    generation = cache.get_or_set(COURSE_SEARCH_GENERATION_KEY, 1, None)
+    return "appsembler_api.course_search.{}.{}".format(generation, digest)
+
+
+def redeem_registration_code(user, course_registration, course_key, mode_is_available):
+    """
+    Record the redemption of a registration code and enroll the user in the code's course.
+
+    Args:
+        user (User): The user redeeming the code.
+        course_registration (CourseRegistrationCode): The valid code being redeemed.
+        course_key (CourseKey): The key of the code's course.
+        mode_is_available (bool): Whether the code's mode_slug, if any, is a mode of the course.
+
+    Returns:
+        None on success, or the reason the enrollment failed.
+    """
+    redemption = RegistrationCodeRedemption.create_invoice_generated_registration_redemption(course_registration, user)
+    try:
+        kwargs = {}
+        if course_registration.mode_slug is not None:
+            if mode_is_available:
+                kwargs["mode"] = course_registration.mode_slug
+            else:
+                raise RedemptionCodeError()
+        redemption.course_enrollment = CourseEnrollment.enroll(user, course_key, **kwargs)
+        redemption.save()
+    except RedemptionCodeError:
+        return "Enrollment code error"
+    except EnrollmentClosedError:
+        return "Enrollment closed"
+    except CourseFullError:
+        return "Course full"
+    except AlreadyEnrolledError:
+        return "Already enrolled"
+    return None
+
+
 def generate_random_string(length):
     """
     Create a string of random characters of specified length
@@ -110,47 +310,294 @@ def generate_random_string(length):
     return "".join((secrets.choice(chars) for i in range(length)))
 
 
-def random_code_generator():
+def random_code_generator(code_length=None):
     """
     generate a random alphanumeric code of length defined in
-    REGISTRATION_CODE_LENGTH settings
+    REGISTRATION_CODE_LENGTH settings, or of the given length
     """
-    code_length = getattr(settings, "REGISTRATION_CODE_LENGTH", 8)
+    if code_length is None:
+        code_length = getattr(settings, "REGISTRATION_CODE_LENGTH", 8)
     return generate_random_string(code_length)
 
 
-def save_registration_code(user, course_id, mode_slug):
+def _next_registration_code_length(code_length, collisions, attempts):
+    """
+    Return the code length to use after `collisions` of `attempts` generated codes were already taken.
+
+    The length grows by one when the collision rate is above the
+    APPSEMBLER_API_REGISTRATION_CODE_GROWTH_THRESHOLD setting (a ratio between 0 and 1, disabled by default),
+    up to the size of the code column.
+    """
+    threshold = getattr(settings, "APPSEMBLER_API_REGISTRATION_CODE_GROWTH_THRESHOLD", None)
+    if threshold is None or not attempts or collisions / attempts <= threshold:
+        return code_length
+    return min(code_length + 1, CourseRegistrationCode._meta.get_field("code").max_length)
+
+
+def _record_registration_code_collisions(collisions, attempts):
+    """
+    Report the registration code collisions of a request as custom monitoring attributes.
+    """
+    set_custom_attribute("appsembler_api.registration_code.attempts", attempts)
+    set_custom_attribute("appsembler_api.registration_code.collisions", collisions)
+    if attempts:
+        set_custom_attribute("appsembler_api.registration_code.collision_rate", collisions / attempts)
+    if collisions:
+        log.info("Registration code generation had %s collisions in %s attempts", collisions, attempts)
+
+
+def iter_registration_code_batches(user, course_id, mode_slug, total):
     """
-    recursive function that generate a new code every time and saves in the Course Registration Table
-    if validation check passes
+    Generate and save `total` registration codes, batch by batch.
+
+    The codes of each batch are generated in memory, checked for collisions against the existing codes
+    with a single query, and inserted with a single bulk_create. If a concurrent request inserts a
+    colliding code in the meantime, the batch is rolled back and generated again.
+
+    The batch size is set by the APPSEMBLER_API_REGISTRATION_CODE_BATCH_SIZE setting. Collisions are
+    bounded by APPSEMBLER_API_REGISTRATION_CODE_MAX_ATTEMPTS and reported as custom monitoring attributes.
 
     Args:
         user (User): The user creating the course registration codes.
         course_id (str): The string representation of the course ID.
         mode_slug (str): The Course Mode Slug associated with any enrollment made by these codes.
+        total (int): The number of codes to generate.
+
+    Yields:
+        The list of codes saved by each batch.
+
+    Raises:
+        RegistrationCodeGenerationError: if a batch could not be filled within the retry budget.
+    """
+    batch_size = getattr(settings, "APPSEMBLER_API_REGISTRATION_CODE_BATCH_SIZE", 1000)
+    max_attempts = getattr(settings, "APPSEMBLER_API_REGISTRATION_CODE_MAX_ATTEMPTS", 10)
+    code_length = getattr(settings, "REGISTRATION_CODE_LENGTH", 8)
+    collisions = attempts = 0
+    remaining = total
+    try:
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            for attempt in range(1, max_attempts + 1):
+                codes, batch_collisions, batch_attempts = _generate_unused_registration_codes(
+                    size, code_length, max_attempts
+                )
+                collisions += batch_collisions
+                attempts += batch_attempts
+                code_length = _next_registration_code_length(code_length, batch_collisions, batch_attempts)
+                try:
+                    with transaction.atomic():
+                        CourseRegistrationCode.objects.bulk_create(
+                            [
+                                CourseRegistrationCode(
+                                    code=code,
+                                    course_id=str(course_id),
+                                    created_by=user,
+                                    invoice=None,
+                                    order=None,
+                                    mode_slug=mode_slug,
+                                    invoice_item=None,
+                                )
+                                for code in codes
+                            ]
+                        )
+                    break
+                except IntegrityError:
+                    collisions += 1
+                    if attempt == max_attempts:
+                        raise RegistrationCodeGenerationError(
+                            "Could not save a batch of registration codes in {} attempts".format(max_attempts)
+                        )
+            remaining -= size
+            yield codes
+    finally:
+        _record_registration_code_collisions(collisions, attempts)
+
+
+def _generate_unused_registration_codes(size, code_length, max_attempts):
+    """
+    Generate `size` distinct random codes that are not used by any existing CourseRegistrationCode.
+
+    Codes are compared case-insensitively, as the code column may use a case-insensitive collation.
 
     Returns:
-        The newly created CourseRegistrationCode.
+        A (codes, collisions, attempts) tuple, where attempts is the number of codes generated
+        and collisions the number of them that were already taken.
 
+    Each round draws as many codes as are still missing, so at most `size * max_attempts` codes are drawn.
+
+    Raises:
+        RegistrationCodeGenerationError: if the codes were not found in `max_attempts` rounds.
     """
-    code = random_code_generator()
+    codes = {}
+    collisions = attempts = 0
+    for __ in range(max_attempts):
+        candidates = {}
+        for __ in range(size - len(codes)):
+            code = random_code_generator(code_length)
+            attempts += 1
+            if code.lower() in codes or code.lower() in candidates:
+                collisions += 1
+            else:
+                candidates[code.lower()] = code
+        used = {
+            code.lower()
+            for code in CourseRegistrationCode.objects.filter(code__in=list(candidates.values())).values_list(
+                "code", flat=True
+            )
+        }
+        collisions += len(used)
+        codes.update((key, code) for key, code in candidates.items() if key not in used)
+        if len(codes) == size:
+            return list(codes.values()), collisions, attempts
+        code_length = _next_registration_code_length(code_length, collisions, attempts)
+    raise RegistrationCodeGenerationError("No free registration codes found in {} attempts".format(max_attempts))
 
-    course_registration = CourseRegistrationCode(
-        code=code,
-        course_id=str(course_id),
-        created_by=user,
-        invoice=None,
-        order=None,
-        mode_slug=mode_slug,
-        invoice_item=None,
-    )
+
+def update_course_enrollment(request, course_id):
+    """
+    Run the instructor enrollment update for a single course and return its decoded results.
+
+    Its "enrollment" timing includes sending the enrollment emails, which the instructor code sends inline.
+
+    The identifiers, action and flags are read from request.POST, as students_update_enrollment expects.
+    """
+    with timed("enrollment"):
+        response = students_update_enrollment(request, course_id=course_id)
+    return json.loads(response.content.decode("utf-8"))
+
+
+def encode_cursor(timestamp, primary_key):
+    """
+    Build an opaque keyset pagination cursor from a timestamp and a primary key.
+
+    The timestamp is None for the cursors of querysets ordered by primary key only.
+    """
+    if timestamp is None:
+        raw = str(primary_key)
+    else:
+        raw = "{}|{}".format(timestamp.isoformat(), primary_key)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor built by `encode_cursor` back into a (timestamp, pk) tuple, where the timestamp
+    is None for a primary key only cursor.
+
+    Raises ValueError if the cursor is malformed.
+    """
     try:
-        with transaction.atomic():
-            course_registration.save()
-        return course_registration
-    except IntegrityError:
-        return save_registration_code(user, course_id, mode_slug)
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        if "|" not in raw:
+            return None, int(raw)
+        timestamp, primary_key = raw.rsplit("|", 1)
+        return parser.isoparse(timestamp), int(primary_key)
+    except (TypeError, ValueError) as err:
+        raise ValueError("Invalid cursor: {}".format(cursor)) from err
+
+
+def filter_after_cursor(queryset, timestamp_field, cursor):
+    """
+    Restrict the queryset to rows strictly after the (timestamp, pk) position encoded in the cursor.
+
+    The queryset is expected to be ordered by (timestamp_field, pk), so that rows sharing
+    the same timestamp are neither skipped nor repeated between pages, or by pk alone when
+    timestamp_field is None.
+
+    Raises ValueError if the cursor is malformed, or has no timestamp when timestamp_field is set.
+    """
+    timestamp, primary_key = decode_cursor(cursor)
+    if timestamp_field is None:
+        return queryset.filter(pk__gt=primary_key)
+    if timestamp is None:
+        raise ValueError("Invalid cursor: {}".format(cursor))
+    return queryset.filter(
+        Q(**{timestamp_field + "__gt": timestamp}) | Q(**{timestamp_field: timestamp, "pk__gt": primary_key})
+    )
+
+
+def merge_ordered_rows(iterables, key):
+    """
+    Merge iterables that are each sorted by key into a single sorted stream, skipping duplicates.
+
+    Rows with the same key are treated as duplicates, so the key must end with the primary key.
+    """
+    last_key = None
+    for row in heapq.merge(*iterables, key=key):
+        row_key = key(row)
+        if row_key != last_key:
+            yield row
+        last_key = row_key
+
+
+def get_batch_page_size(value):
+    """
+    Parse the page_size query parameter of the batch analytics endpoints.
+
+    Defaults to the APPSEMBLER_API_BATCH_PAGE_SIZE setting when no value is given,
+    and is capped by the APPSEMBLER_API_BATCH_MAX_PAGE_SIZE setting.
+    Raises ValueError if the value is not a positive integer.
+    """
+    page_size = int(value or getattr(settings, "APPSEMBLER_API_BATCH_PAGE_SIZE", 1000))
+    if page_size < 1:
+        raise ValueError("page_size must be a positive integer")
+    return min(page_size, getattr(settings, "APPSEMBLER_API_BATCH_MAX_PAGE_SIZE", 10000))
+
+
+def get_cursor_page(querysets, timestamp_field, cursor, page_size, key):
+    """
+    Return one page of the rows after the cursor, merged from querysets ordered by (timestamp_field, pk).
+
+    Args:
+        querysets (list): Querysets ordered by (timestamp_field, pk); their rows are merged and deduplicated.
+        timestamp_field (str): The name of the timestamp field the querysets are ordered by,
+            or None for querysets ordered by pk only.
+        cursor (str): A cursor built by `encode_cursor`, or None to start from the first row.
+        page_size (int): The maximum number of rows to return.
+        key (callable): Returns the (timestamp, pk) position of a row, or (None, pk) without timestamp_field.
+
+    Returns:
+        A (rows, next_cursor, has_more) tuple. next_cursor is the position of the last row returned,
+        or the given cursor when there are no new rows, so a client can always resume from it.
+
+    Raises ValueError if the cursor is malformed.
+    """
+    if cursor:
+        querysets = [filter_after_cursor(queryset, timestamp_field, cursor) for queryset in querysets]
+    rows = merge_ordered_rows([queryset[: page_size + 1] for queryset in querysets], key)
+    rows = list(itertools.islice(rows, page_size + 1))
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if rows:
+        cursor = encode_cursor(*key(rows[-1]))
+    return rows, cursor, has_more
+
+
+def iter_cursor_pages(querysets, timestamp_field, page_size, key, cursor=None):
+    """
+    Return an iterator over every row after the cursor, fetched page by page with `get_cursor_page`.
+
+    Unlike QuerySet.iterator(), which the MySQL driver buffers whole, each page is a separate
+    keyset query, so at most `page_size` rows per queryset are held in memory at a time.
+
+    Raises ValueError if the cursor is malformed, before any row is read.
+    """
+    if cursor:
+        querysets = [filter_after_cursor(queryset, timestamp_field, cursor) for queryset in querysets]
+    return _iter_cursor_pages(querysets, timestamp_field, page_size, key)
+
+
+def _iter_cursor_pages(querysets, timestamp_field, page_size, key):
+    cursor = None
+    has_more = True
+    while has_more:
+        rows, cursor, has_more = get_cursor_page(querysets, timestamp_field, cursor, page_size, key)
+        yield from rows
 
 
 class RedemptionCodeError(Exception):
     """An error occurs while processing redemption codes."""
+
+
+class RegistrationCodeGenerationError(Exception):
+    """No free registration code could be generated within the retry budget."""
@@ -1,73 +1,93 @@
 """Views for the API"""
 
-import json
+# pylint: disable=too-many-lines
+
+import itertools
 import logging
+import math
 import secrets
 import string
+from concurrent.futures import ThreadPoolExecutor
 
 import pytz
 import search
 from common.djangoapps.course_modes.models import CourseMode
-from common.djangoapps.student.models import (
-    AlreadyEnrolledError,
-    CourseEnrollment,
-    CourseFullError,
-    EnrollmentClosedError,
-    UserProfile,
-)
+from common.djangoapps.student.models import CourseEnrollment, UserProfile
 from common.djangoapps.student.views import validate_new_email
 from common.djangoapps.util.disable_rate_limit import can_disable_rate_limit
+from crum import set_current_request
 from dateutil import parser
+from django.conf import settings
 from django.contrib import auth
+from django.core.cache import cache
 from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
 from django.core.validators import validate_email
+from django.db import connection, transaction
 from django.db.models import Q
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
 from django.urls import reverse
 from django_ratelimit.core import is_ratelimited
 from django_ratelimit.exceptions import Ratelimited
 from edx_rest_framework_extensions.paginators import NamespacedPageNumberPagination
 from lms.djangoapps.certificates.models import GeneratedCertificate
-from lms.djangoapps.course_api.api import list_courses
+from lms.djangoapps.course_api.api import get_effective_user, list_courses
 from lms.djangoapps.course_api.serializers import CourseSerializer
-from lms.djangoapps.instructor.views.api import students_update_enrollment
+from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
 from openedx.core.djangoapps.enrollments.views import (
     ApiKeyPermissionMixIn,
     EnrollmentCrossDomainSessionAuth,
     EnrollmentUserThrottle,
 )
+from openedx.core.djangoapps.theming.helpers import get_current_site
 from openedx.core.djangoapps.user_authn.views.register import create_account_with_params
-from openedx.core.djangoapps.user_authn.views.registration_form import (
-    get_registration_extension_form,
-)
 from openedx.core.lib.api.authentication import BearerAuthenticationAllowInactiveUser
 from openedx.core.lib.api.permissions import (
     ApiKeyHeaderPermissionIsAuthenticated,
     IsStaffOrOwner,
 )
-from openedx.core.lib.api.view_utils import DeveloperErrorViewMixin, view_auth_classes
-from openedx.core.lib.courses import get_course_by_id
+from openedx.core.lib.api.view_utils import (
+    DeveloperErrorViewMixin,
+    LazySequence,
+    view_auth_classes,
+)
 from rest_framework import status
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 from .forms import CourseListGetAndSearchForm
-from .models import CourseRegistrationCode, RegistrationCodeRedemption
+from .instrumentation import InstrumentedViewMixin, timed
+from .models import BulkEnrollmentJob, CourseRegistrationCode
+from .renderers import CSVRenderer, JSONLinesRenderer
 from .serializers import BulkEnrollmentSerializer
+from .tasks import start_bulk_enrollment_job
 from .utils import (
-    RedemptionCodeError,
+    RegistrationCodeGenerationError,
     account_exists,
+    account_is_retired,
     auto_generate_username,
+    get_batch_page_size,
+    get_course_redemption_info,
+    get_course_search_cache_key,
+    get_cursor_page,
+    get_reg_code_redemptions,
     get_reg_code_validity,
-    save_registration_code,
+    get_registration_extension_form_info,
+    iter_cursor_pages,
+    iter_registration_code_batches,
+    merge_ordered_rows,
+    redeem_registration_code,
     send_activation_email,
+    update_course_enrollment,
 )
 
 User = auth.get_user_model()
 
 log = logging.getLogger(__name__)
+AUDIT_LOG = logging.getLogger("audit")
 
 
 class CreateUserAccountView(APIView):
@@ -95,16 +115,6 @@ class CreateUserAccountView(APIView):
         """
         data = request.data
 
-        # set the honor_code and honor_code like checked,
-        # so we can use the already defined methods for creating an user
-        data["honor_code"] = "True"
-        data["terms_of_service"] = "True"
-
-        if "send_activation_email" in data and data["send_activation_email"] == "False":
-            data["send_activation_email"] = False
-        else:
-            data["send_activation_email"] = True
-
         email = request.data.get("email")
         username = request.data.get("username")
 
@@ -115,10 +125,7 @@ class CreateUserAccountView(APIView):
             return Response(errors, status=409)
 
         try:
-            user = create_account_with_params(request, data)
-            # set the user as active
-            user.is_active = True
-            user.save()
+            user = self.create_account(request, data)
             user_id = user.id
         except ValidationError as err:
             # Should only get non-field errors from this function
@@ -131,6 +138,112 @@ class CreateUserAccountView(APIView):
         response = Response({"user_id ": user_id}, status=200)
         return response
 
+    def create_account(self, request, data):
+        """
+        Create an active user account from the parameters of one account.
+
+        Raises ValidationError if the parameters are not valid.
+        """
+        # set the honor_code and honor_code like checked,
+        # so we can use the already defined methods for creating an user
+        data["honor_code"] = "True"
+        data["terms_of_service"] = "True"
+
+        if "send_activation_email" in data and data["send_activation_email"] == "False":
+            data["send_activation_email"] = False
+        else:
+            data["send_activation_email"] = True
+
+        user = create_account_with_params(request, data)
+        # set the user as active, only writing the flag and only when registration did not already activate it
+        if not user.is_active:
+            user.is_active = True
+            user.save(update_fields=["is_active"])
+        return user
+
+
+class BulkCreateUserAccountView(CreateUserAccountView):
+    """
+    Create many user accounts in one request.
+
+    The emails and usernames of all the accounts are checked for conflicts with two queries, and
+    the accounts that do not conflict are checked for retired emails and usernames, then created one
+    after the other, like CreateUserAccountView does.
+    """
+
+    def post(self, request):
+        """
+        URL: /appsembler_api/v0/accounts/bulk_create
+        Arguments:
+            request (HttpRequest)
+            JSON (application/json)
+            {
+                "accounts": [
+                    {
+                        "username": "staff4",
+                        "password": "edx",
+                        "email": "staff4@example.com",
+                        "name": "stafftest"
+                    },
+                    ...
+                ]
+            }
+        Returns:
+            HttpResponse: 200 with {"results": [...]}, one result per account in the same order:
+                {"email": ..., "username": ..., "status": 200, "user_id": 9} if the account was created
+                {"email": ..., "username": ..., "status": 409, "user_message": ...} if an account with
+                    the username or email address already exists, or was created earlier in the request
+                {"email": ..., "username": ..., "status": 400, "user_message": ...} if the account is not valid
+            HttpResponse: 400 if accounts is not a list of objects or has more than
+                APPSEMBLER_API_MAX_BULK_ACCOUNTS accounts
+        """
+        accounts = request.data.get("accounts")
+        max_accounts = getattr(settings, "APPSEMBLER_API_MAX_BULK_ACCOUNTS", 100)
+        if not isinstance(accounts, list) or not all(isinstance(account, dict) for account in accounts):
+            return Response({"user_message": "accounts must be a list of objects"}, status=400)
+        if len(accounts) > max_accounts:
+            return Response(
+                {"user_message": "At most {} accounts can be created in one request".format(max_accounts)},
+                status=400,
+            )
+
+        # MySQL compares emails and usernames case-insensitively, so the taken ones are compared lowercased
+        taken_emails = {
+            email.lower()
+            for email in User.objects.filter(email__in={account.get("email") for account in accounts}).values_list(
+                "email", flat=True
+            )
+        }
+        taken_usernames = {
+            username.lower()
+            for username in User.objects.filter(
+                username__in={account.get("username") for account in accounts}
+            ).values_list("username", flat=True)
+        }
+
+        results = []
+        for account in accounts:
+            email = account.get("email")
+            username = account.get("username")
+            email_key = email.lower() if isinstance(email, str) else email
+            username_key = username.lower() if isinstance(username, str) else username
+            result = {"email": email, "username": username}
+            # the accounts left are still checked one by one for a retired email or username
+            if email_key in taken_emails or username_key in taken_usernames or account_is_retired(email, username):
+                result.update({"status": 409, "user_message": "User already exists"})
+            else:
+                try:
+                    result.update({"status": 200, "user_id": self.create_account(request, account).id})
+                except ValidationError:
+                    result.update({"status": 400, "user_message": "Wrong parameters on user creation"})
+                else:
+                    # only a created account conflicts with the later accounts of the request
+                    taken_emails.add(email_key)
+                    taken_usernames.add(username_key)
+            results.append(result)
+
+        return Response({"results": results}, status=200)
+
 
 class CreateUserAccountWithoutPasswordView(APIView):
     authentication_classes = (BearerAuthenticationAllowInactiveUser,)
@@ -168,9 +281,10 @@ class CreateUserAccountWithoutPasswordView(APIView):
             data["send_activation_email"] = False
 
             user = create_account_with_params(request, data)
-            # set the user as inactive
-            user.is_active = False
-            user.save()
+            # set the user as inactive, registration only activates the account in some configurations
+            if user.is_active:
+                user.is_active = False
+                user.save(update_fields=["is_active"])
             user_id = user.id
             send_activation_email(request)
         except ValidationError as err:
@@ -220,10 +334,13 @@ class UserAccountConnect(APIView):
         new_name = data.get("name", "")
 
         try:
-            user = User.objects.get(username=username)
+            user = User.objects.select_related("profile").get(username=username)
+            # only the changed columns are written, and nothing at all when nothing changed
+            user_fields_to_update = []
 
-            if new_password.strip() != "":
+            if new_password.strip() != "" and not user.check_password(new_password):
                 user.set_password(new_password)
+                user_fields_to_update.append("password")
 
             if new_email.strip() != "" and new_email != user.email:
                 try:
@@ -234,15 +351,20 @@ class UserAccountConnect(APIView):
                         return Response(errors, status=409)
 
                     user.email = new_email
+                    user_fields_to_update.append("email")
                 except ValidationError:
                     errors = {"user_message": "Invalid email format"}
                     return Response(errors, status=409)
 
-            if new_name.strip() != "":
+            update_profile_name = new_name.strip() != "" and new_name != user.profile.name
+            if update_profile_name:
                 user.profile.name = new_name
-                user.profile.save()
 
-            user.save()
+            with transaction.atomic():
+                if update_profile_name:
+                    user.profile.save(update_fields=["name"])
+                if user_fields_to_update:
+                    user.save(update_fields=user_fields_to_update)
 
         except User.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
@@ -259,6 +381,18 @@ class UpdateUserAccount(APIView):
 
     authentication_classes = (BearerAuthenticationAllowInactiveUser,)
     permission_classes = (IsStaffOrOwner,)
+    profile_fields = (
+        "name",
+        "level_of_education",
+        "gender",
+        "mailing_address",
+        "city",
+        "country",
+        "goals",
+        "bio",
+        "year_of_birth",
+        "language",
+    )
 
     def post(self, request):
         """
@@ -312,51 +446,37 @@ class UpdateUserAccount(APIView):
         updated_fields = {}
 
         # update email
-        if "email" in data and data["email"] != user.email:
+        update_email = "email" in data and data["email"] != user.email
+        if update_email:
             try:
                 validate_new_email(user, data["email"])
             except ValueError as err:
                 return Response({"integrity_error": str(err)}, status=400)
 
             user.email = data["email"]
-            user.save()
             updated_fields.update({"email": data["email"]})
 
         # update profile fields
-        profile_fields = [
-            "name",
-            "level_of_education",
-            "gender",
-            "mailing_address",
-            "city",
-            "country",
-            "goals",
-            "bio",
-            "year_of_birth",
-            "language",
-        ]
-
         profile_fields_to_update = {}
-        for field in profile_fields:
+        for field in self.profile_fields:
             if field in data:
                 profile_fields_to_update[field] = data[field]
-
-        if len(profile_fields_to_update):
-            UserProfile.objects.filter(user=user).update(**profile_fields_to_update)
-            updated_fields.update(profile_fields_to_update)
+        updated_fields.update(profile_fields_to_update)
 
         # If there is an exension form fields installed update them too
+        custom_form = get_registration_extension_form_info()
         custom_profile_fields_to_update = {}
-        custom_form = get_registration_extension_form()
-
         if custom_form is not None:
-            for custom_field in custom_form.fields:
-                if custom_field in data:
-                    custom_profile_fields_to_update[custom_field] = data[custom_field]
-                    updated_fields.update(custom_profile_fields_to_update)
-
+            custom_profile_fields_to_update = {field: data[field] for field in data.keys() & custom_form.field_names}
+            updated_fields.update(custom_profile_fields_to_update)
+
+        with transaction.atomic():
+            if update_email:
+                user.save(update_fields=["email"])
+            if len(profile_fields_to_update):
+                UserProfile.objects.filter(user=user).update(**profile_fields_to_update)
             if len(custom_profile_fields_to_update):
-                custom_form.Meta.model.objects.filter(user=user).update(**custom_profile_fields_to_update)
+                custom_form.model.objects.filter(user=user).update(**custom_profile_fields_to_update)
 
         return Response(
             {
@@ -368,6 +488,166 @@ class UpdateUserAccount(APIView):
         )
 
 
+class BulkUpdateUserAccounts(UpdateUserAccount):
+    """
+    HTTP endpoint for updating many user accounts in one request.
+
+    All the user lookups are resolved with one query, and the profile and extension form fields
+    are written with one UPDATE, or one bulk_update, per set of updated fields.
+    """
+
+    def post(self, request):
+        """
+        URL: /appsembler_api/v0/accounts/bulk_update_user
+        Arguments:
+            request (HttpRequest)
+            JSON (application/json)
+            {
+                "users": [
+                    {
+                        "user_lookup": "staff4",  # mandatory, like in UpdateUserAccount
+                        "email": "staff@example.com",
+                        "bio": "this is my bio",
+                        "country": "BR"
+                    },
+                    ...
+                ]
+            }
+        Returns:
+            HttpResponse: 200 with {"results": [...]}, one result per user in the same order:
+                {"user_lookup": "staff4", "status": 200, "updated_fields": {"email": ..., ...}} on success,
+                or the status and error of UpdateUserAccount, e.g.
+                {"user_lookup": "staff5", "status": 404, "user_not_found": ...}
+                A user can only be updated once per request, and two users can not get the same new email.
+            HttpResponse: 400 if users is not a list of objects or has more than
+                APPSEMBLER_API_MAX_BULK_UPDATES users
+        """
+        updates = request.data.get("users")
+        max_updates = getattr(settings, "APPSEMBLER_API_MAX_BULK_UPDATES", 10000)
+        if not isinstance(updates, list) or not all(isinstance(update, dict) for update in updates):
+            return Response({"user_message": "users must be a list of objects"}, status=400)
+        if len(updates) > max_updates:
+            return Response(
+                {"user_message": "At most {} users can be updated in one request".format(max_updates)}, status=400
+            )
+
+        custom_form = get_registration_extension_form_info()
+        custom_fields = custom_form.field_names if custom_form is not None else frozenset()
+        results, email_changes, profile_updates, custom_profile_updates = self._plan_updates(updates, custom_fields)
+
+        chunk_size = getattr(settings, "APPSEMBLER_API_BATCH_CHUNK_SIZE", 2000)
+        with transaction.atomic():
+            # emails are saved one by one, so that the User save signals still see every email change
+            for user in email_changes:
+                user.save(update_fields=["email"])
+            self._bulk_update_fields(UserProfile, profile_updates, chunk_size)
+            if custom_form is not None:
+                self._bulk_update_fields(custom_form.model, custom_profile_updates, chunk_size)
+
+        return Response({"results": results}, status=200)
+
+    def _plan_updates(self, updates, custom_fields):
+        """
+        Check every update and return the results, along with the users whose email changes and the
+        {user_id: {field: value}} profile and extension form updates of the valid updates.
+        """
+        users_by_lookup = self._get_users_by_lookup(str(update.get("user_lookup", "")) for update in updates)
+        results = []
+        updated_user_ids = set()
+        new_emails = set()
+        email_changes = []
+        profile_updates = {}
+        custom_profile_updates = {}
+        for update in updates:
+            result = {"user_lookup": update.get("user_lookup")}
+            user, error = self._check_update(update, users_by_lookup, updated_user_ids, new_emails)
+            if user is None:
+                result.update(error)
+                results.append(result)
+                continue
+
+            updated_user_ids.add(user.id)
+            updated_fields = {}
+            if "email" in update and update["email"] != user.email:
+                new_emails.add(update["email"].lower())
+                user.email = update["email"]
+                email_changes.append(user)
+                updated_fields["email"] = update["email"]
+            profile_updates[user.id] = {field: update[field] for field in self.profile_fields if field in update}
+            custom_profile_updates[user.id] = {field: update[field] for field in update.keys() & custom_fields}
+            updated_fields.update(profile_updates[user.id])
+            updated_fields.update(custom_profile_updates[user.id])
+            result.update({"status": 200, "updated_fields": updated_fields})
+            results.append(result)
+        return results, email_changes, profile_updates, custom_profile_updates
+
+    @staticmethod
+    def _get_users_by_lookup(lookups):
+        """
+        Return the users matching the lookups by username or email, keyed by their lowercased username and email.
+        """
+        lookups = set(lookups)
+        users = User.objects.filter(Q(username__in=lookups) | Q(email__in=lookups)).only("id", "username", "email")
+        users_by_lookup = {}
+        for user in users:
+            # usernames and emails are compared case-insensitively by the database collation
+            users_by_lookup.setdefault(user.username.lower(), []).append(user)
+            if user.email.lower() != user.username.lower():
+                users_by_lookup.setdefault(user.email.lower(), []).append(user)
+        return users_by_lookup
+
+    @staticmethod
+    def _check_update(update, users_by_lookup, updated_user_ids, new_emails):
+        """
+        Return a (user, None) tuple with the user to update, or a (None, error) tuple if the update is not valid.
+        """
+        lookup = str(update.get("user_lookup", ""))
+        if not lookup.strip():
+            return None, {"status": 400, "lookup_error": "No user lookup has been provided"}
+        users = users_by_lookup.get(lookup.lower(), [])
+        if not users:
+            return None, {"status": 404, "user_not_found": "The user for the Given username or email doesn't exists"}
+        if len(users) > 1:
+            return None, {"status": 400, "lookup_error": "Two users have been found with the provided user_lookup"}
+        user = users[0]
+        if user.id in updated_user_ids:
+            return None, {"status": 400, "lookup_error": "The user is updated more than once in this request"}
+
+        if "email" in update and update["email"] != user.email:
+            try:
+                validate_new_email(user, update["email"])
+                if update["email"].lower() in new_emails:
+                    raise ValueError("The email is used by another user of this request")
+            except ValueError as err:
+                return None, {"status": 400, "integrity_error": str(err)}
+        return user, None
+
+    @staticmethod
+    def _bulk_update_fields(model, updates, chunk_size):
+        """
+        Write {user_id: {field: value}} updates to the rows of model, per group of users updating the same fields:
+        with one UPDATE per chunk of users if they all set the same values, or with bulk_update otherwise.
+        """
+        groups = {}
+        for user_id, fields in updates.items():
+            if fields:
+                groups.setdefault(tuple(sorted(fields)), {})[user_id] = fields
+
+        for field_names, group in groups.items():
+            user_ids = list(group)
+            first_fields = group[user_ids[0]]
+            if all(fields == first_fields for fields in group.values()):
+                for start in range(0, len(user_ids), chunk_size):
+                    model.objects.filter(user_id__in=user_ids[start : start + chunk_size]).update(**first_fields)
+                continue
+
+            rows = list(model.objects.filter(user_id__in=user_ids).only("id", "user_id", *field_names))
+            for row in rows:
+                for field, value in group[row.user_id].items():
+                    setattr(row, field, value)
+            model.objects.bulk_update(rows, field_names, batch_size=chunk_size)
+
+
 class GetUserAccountView(APIView):
     authentication_classes = (BearerAuthenticationAllowInactiveUser,)
     permission_classes = (IsStaffOrOwner,)
@@ -386,15 +666,86 @@ class GetUserAccountView(APIView):
 
         """
         try:
-            account_settings = User.objects.select_related("profile").get(username=username)
+            found_username = User.objects.values_list("username", flat=True).get(username=username)
         except User.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
-        return Response({"user_id": account_settings.username}, status=200)
+        return Response({"user_id": found_username}, status=200)
+
+
+class GetUserAccountsView(APIView):
+    """
+    Check which of a list of usernames and emails have an account, in one request.
+    """
+
+    authentication_classes = (BearerAuthenticationAllowInactiveUser,)
+    permission_classes = (IsStaffOrOwner,)
+    lookup_fields = ("username", "email")
+
+    def post(self, request):
+        """
+        URL: /appsembler_api/v0/accounts/get-users
+        Arguments:
+            request (HttpRequest)
+            JSON (application/json)
+            {
+                "usernames": ["staff", "honor"],
+                "emails": ["staff@example.com", "missing@example.com"]
+            }
+        Returns:
+            HttpResponse: 200 with the found and missing identifiers of each list that was given:
+            {
+                "usernames": {"found": ["staff", "honor"], "missing": []},
+                "emails": {"found": ["staff@example.com"], "missing": ["missing@example.com"]}
+            }
+            HttpResponse: 400 if no list is given, a list is not a list of strings or the lists hold more than
+                APPSEMBLER_API_MAX_BULK_LOOKUPS identifiers
+
+        The identifiers are looked up with one query per APPSEMBLER_API_BATCH_CHUNK_SIZE identifiers,
+        and compared case-insensitively, like the database collation does.
+        """
+        identifiers = {
+            field: request.data.get(field + "s") for field in self.lookup_fields if field + "s" in request.data
+        }
+        max_lookups = getattr(settings, "APPSEMBLER_API_MAX_BULK_LOOKUPS", 10000)
+        if not identifiers or not all(
+            isinstance(values, list) and all(isinstance(value, str) for value in values)
+            for values in identifiers.values()
+        ):
+            return Response({"user_message": "usernames or emails must be a list of strings"}, status=400)
+        if sum(len(values) for values in identifiers.values()) > max_lookups:
+            return Response(
+                {"user_message": "At most {} usernames and emails can be looked up in one request".format(max_lookups)},
+                status=400,
+            )
+
+        chunk_size = getattr(settings, "APPSEMBLER_API_BATCH_CHUNK_SIZE", 2000)
+        response_data = {}
+        for field, values in identifiers.items():
+            found = set()
+            for start in range(0, len(values), chunk_size):
+                users = User.objects.filter(**{field + "__in": values[start : start + chunk_size]})
+                found.update(value.lower() for value in users.values_list(field, flat=True))
+            response_data[field + "s"] = {
+                "found": [value for value in values if value.lower() in found],
+                "missing": [value for value in values if value.lower() not in found],
+            }
+        return Response(response_data, status=200)
 
 
 @can_disable_rate_limit
-class BulkEnrollView(APIView, ApiKeyPermissionMixIn):
+class BulkEnrollView(InstrumentedViewMixin, APIView, ApiKeyPermissionMixIn):
+    """
+    Enroll or unenroll a list of identifiers in a list of courses.
+
+    By default the courses are processed one after the other. Setting APPSEMBLER_API_BULK_ENROLL_MAX_WORKERS
+    to more than 1 processes up to that many courses concurrently, each in its own thread and database
+    connection. Each course's changes are then committed on their own, outside of the request transaction.
+
+    With async=true the request is saved as a BulkEnrollmentJob and run in the background instead;
+    the response holds the job id to poll with BulkEnrollmentJobView.
+    """
+
     authentication_classes = (BearerAuthenticationAllowInactiveUser, EnrollmentCrossDomainSessionAuth)
     permission_classes = (ApiKeyHeaderPermissionIsAuthenticated,)
     throttle_classes = (EnrollmentUserThrottle,)
@@ -402,6 +753,24 @@ class BulkEnrollView(APIView, ApiKeyPermissionMixIn):
     def post(self, request):
         serializer = BulkEnrollmentSerializer(data=request.data)
         if serializer.is_valid():
+            if str(request.data.get("async", "")).lower() == "true":
+                job = BulkEnrollmentJob.objects.create(
+                    created_by=request.user,
+                    parameters=serializer.data,
+                    site=get_current_site(),
+                    host=request.get_host(),
+                    is_secure=request.is_secure(),
+                )
+                start_bulk_enrollment_job(job)
+                return Response(
+                    data={
+                        "job_id": job.id,
+                        "status": job.status,
+                        "status_url": reverse("appsembler_api:bulk_enrollment_job_api", kwargs={"job_id": job.id}),
+                    },
+                    status=status.HTTP_202_ACCEPTED,
+                )
+
             request._request.POST = request.data  # pylint: disable=protected-access
             response_dict = {
                 "auto_enroll": serializer.data.get("auto_enroll"),
@@ -409,19 +778,89 @@ class BulkEnrollView(APIView, ApiKeyPermissionMixIn):
                 "action": serializer.data.get("action"),
                 "courses": {},
             }
-            for course in serializer.data.get("courses"):
-                response = students_update_enrollment(
-                    request._request,  # pylint: disable=protected-access
-                    course_id=course,
-                )
-                response_dict["courses"][course] = json.loads(response.content.decode("utf-8"))
+            django_request = request._request  # pylint: disable=protected-access
+            courses = serializer.data.get("courses")
+            max_workers = min(getattr(settings, "APPSEMBLER_API_BULK_ENROLL_MAX_WORKERS", 1), len(courses))
+            if max_workers > 1:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    results = executor.map(
+                        lambda course: self._update_course_enrollment_in_thread(django_request, course), courses
+                    )
+                    response_dict["courses"].update(zip(courses, results))
+            else:
+                for course in courses:
+                    response_dict["courses"][course] = update_course_enrollment(django_request, course)
             return Response(data=response_dict, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _update_course_enrollment_in_thread(self, django_request, course):
+        """
+        Run `update_course_enrollment` in a worker thread, closing the database connection the thread opened.
+
+        The request is also made the thread's current request, which the site aware code (site
+        configuration, enrollment emails) reads through crum.
+        """
+        set_current_request(django_request)
+        try:
+            return update_course_enrollment(django_request, course)
+        finally:
+            set_current_request(None)
+            connection.close()
+
+
+class BulkEnrollmentJobView(APIView):
+    """
+    Report the status, progress and per-course results of a BulkEnrollmentJob.
+
+    Only the user who started the job, or a staff user, can see it.
+    """
+
+    authentication_classes = (BearerAuthenticationAllowInactiveUser, EnrollmentCrossDomainSessionAuth)
+    permission_classes = (ApiKeyHeaderPermissionIsAuthenticated,)
+
+    def get(self, request, job_id):
+        jobs = BulkEnrollmentJob.objects.all()
+        if not request.user.is_staff:
+            jobs = jobs.filter(created_by=request.user)
+        try:
+            job = jobs.get(id=job_id)
+        except BulkEnrollmentJob.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        duration = None
+        if job.started_at and job.finished_at:
+            duration = (job.finished_at - job.started_at).total_seconds()
+        return Response(
+            data={
+                "job_id": job.id,
+                "status": job.status,
+                "auto_enroll": job.parameters.get("auto_enroll"),
+                "email_students": job.parameters.get("email_students"),
+                "action": job.parameters.get("action"),
+                "progress": {"completed": len(job.results), "total": len(job.parameters.get("courses", []))},
+                "courses": job.results,
+                "error": job.error,
+                "created_at": job.created_at,
+                "started_at": job.started_at,
+                "finished_at": job.finished_at,
+                "duration": duration,
+            },
+            status=status.HTTP_200_OK,
+        )
+
 
 class GenerateRegistrationCodesView(APIView):
+    """
+    Generate enrollment codes for a course.
+
+    The codes are returned in a single JSON response, for up to APPSEMBLER_API_MAX_REGISTRATION_CODES codes.
+    With ?format=jsonl or ?format=csv, the codes are streamed instead, as each batch of codes is saved,
+    for up to APPSEMBLER_API_MAX_STREAMED_REGISTRATION_CODES codes.
+    """
+
     authentication_classes = (BearerAuthenticationAllowInactiveUser, EnrollmentCrossDomainSessionAuth)
     permission_classes = (IsStaffOrOwner,)
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [JSONLinesRenderer, CSVRenderer]
 
     def post(self, request):
         course_id = CourseKey.from_string(request.data.get("course_id"))
@@ -433,14 +872,39 @@ class GenerateRegistrationCodesView(APIView):
 
         course_mode = CourseMode.DEFAULT_MODE_SLUG
 
+        renderer = request.accepted_renderer
+        streamed = isinstance(renderer, (JSONLinesRenderer, CSVRenderer))
+        if streamed:
+            max_codes = getattr(settings, "APPSEMBLER_API_MAX_STREAMED_REGISTRATION_CODES", 1000000)
+            error = "At most {} codes can be streamed in one request"
+        else:
+            max_codes = getattr(settings, "APPSEMBLER_API_MAX_REGISTRATION_CODES", 10000)
+            error = (
+                "At most {} codes can be generated in one request, "
+                "use format=jsonl or format=csv to stream more codes"
+            )
+        if course_code_number > max_codes:
+            return Response(data={"error": error.format(max_codes)}, status=status.HTTP_400_BAD_REQUEST)
+
+        batches = iter_registration_code_batches(request.user, course_id, course_mode, course_code_number)
+        if streamed:
+            rows = self._iter_code_rows(batches, request.data.get("course_id"))
+            if isinstance(renderer, CSVRenderer):
+                stream = renderer.stream(rows, ("course_id", "code", "error"))
+            else:
+                stream = renderer.stream(rows)
+            return StreamingHttpResponse(stream, content_type=renderer.media_type)
+
         registration_codes = []
-        for __ in range(course_code_number):
-            generated_registration_code = save_registration_code(
-                request.user,
-                course_id,
-                course_mode,
+        try:
+            for codes in batches:
+                registration_codes.extend(codes)
+        except RegistrationCodeGenerationError as exc:
+            # the codes of the batches saved before the failure stay valid
+            return Response(
+                data={"error": str(exc), "codes": registration_codes, "course_id": request.data.get("course_id")},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
             )
-            registration_codes.append(generated_registration_code.code)
 
         return Response(
             data={
@@ -450,8 +914,22 @@ class GenerateRegistrationCodesView(APIView):
             }
         )
 
+    @staticmethod
+    def _iter_code_rows(batches, course_id):
+        """
+        Yield a row for each saved code, and a last row with the error if a batch could not be saved.
+
+        The status of a streamed response is already sent, so the error can only be reported in the body.
+        """
+        try:
+            for codes in batches:
+                for code in codes:
+                    yield {"course_id": course_id, "code": code}
+        except RegistrationCodeGenerationError as exc:
+            yield {"course_id": course_id, "error": str(exc)}
 
-class EnrollUserWithEnrollmentCodeView(APIView):
+
+class EnrollUserWithEnrollmentCodeView(InstrumentedViewMixin, APIView):
     authentication_classes = (BearerAuthenticationAllowInactiveUser, EnrollmentCrossDomainSessionAuth)
     permission_classes = (IsStaffOrOwner,)
 
@@ -475,32 +953,19 @@ class EnrollUserWithEnrollmentCodeView(APIView):
             reg_code_is_valid = False
             error_reason = "Enrollment code not found"
         if user_is_valid and reg_code_is_valid:
-            course = get_course_by_id(course_registration.course_id, depth=0)
-            redemption = RegistrationCodeRedemption.create_invoice_generated_registration_redemption(
-                course_registration, user
+            course_info = get_course_redemption_info(course_registration.course_id)
+            mode_is_available = (
+                course_registration.mode_slug is None or course_registration.mode_slug in course_info["mode_slugs"]
             )
-            try:
-                kwargs = {}
-                if course_registration.mode_slug is not None:
-                    if CourseMode.mode_for_course(course.id, course_registration.mode_slug):
-                        kwargs["mode"] = course_registration.mode_slug
-                    else:
-                        raise RedemptionCodeError()
-                redemption.course_enrollment = CourseEnrollment.enroll(user, course.id, **kwargs)
-                redemption.save()
+            error_reason = redeem_registration_code(
+                user, course_registration, CourseKey.from_string(course_info["course_id"]), mode_is_available
+            )
+            if error_reason is None:
                 return Response(
                     data={
                         "success": True,
                     }
                 )
-            except RedemptionCodeError:
-                error_reason = "Enrollment code error"
-            except EnrollmentClosedError:
-                error_reason = "Enrollment closed"
-            except CourseFullError:
-                error_reason = "Course full"
-            except AlreadyEnrolledError:
-                error_reason = "Already enrolled"
         return Response(
             data={
                 "success": False,
@@ -510,6 +975,120 @@ class EnrollUserWithEnrollmentCodeView(APIView):
         )
 
 
+class BatchEnrollUsersWithEnrollmentCodesView(APIView):
+    """
+    Redeem a list of (email, enrollment_code) pairs in one request.
+
+    The users and codes are resolved with one query each, and each distinct course and
+    its modes are loaded once. Each item gets the same failure reasons as
+    EnrollUserWithEnrollmentCodeView, plus "Course not found" when the code's course does not exist.
+    """
+
+    authentication_classes = (BearerAuthenticationAllowInactiveUser, EnrollmentCrossDomainSessionAuth)
+    permission_classes = (IsStaffOrOwner,)
+
+    def post(self, request):
+        """
+        URL: /appsembler_api/v0/enrollment-codes/batch-enroll
+        Arguments:
+            request (HttpRequest)
+            JSON (application/json)
+            {
+                "items": [
+                    {"email": "staff@example.com", "enrollment_code": "V5QBQMN6"},
+                    ...
+                ]
+            }
+        Returns:
+            HttpResponse: 200 with {"results": [{"email", "enrollment_code", "success", "reason"}, ...]},
+                in the order of the items
+            HttpResponse: 400 if items is not a list of objects or has more than
+                APPSEMBLER_API_MAX_BATCH_REDEMPTIONS items
+            HttpResponse: 403 if the rate limiting is exceeded, counting each invalid code; no code is
+                redeemed then
+        """
+        if is_ratelimited(request, key="user", group="enrollment-codes.enroll-user", rate="6/m"):
+            raise Ratelimited()
+
+        items = request.data.get("items")
+        max_items = getattr(settings, "APPSEMBLER_API_MAX_BATCH_REDEMPTIONS", 1000)
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return Response({"error": "items must be a list of objects"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > max_items:
+            return Response(
+                {"error": "At most {} items can be redeemed in one request".format(max_items)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # MySQL compares the emails and codes case-insensitively, so the found rows are matched the same way
+        users = {
+            user.email.lower(): user for user in User.objects.filter(email__in={item.get("email") for item in items})
+        }
+        course_registrations = {
+            course_registration.code.lower(): course_registration
+            for course_registration in CourseRegistrationCode.objects.filter(
+                code__in={item.get("enrollment_code") for item in items}, is_valid=True
+            )
+        }
+
+        # every invalid code counts toward the rate limiting, like one EnrollUserWithEnrollmentCodeView request
+        for item in items:
+            if self._lookup_key(item.get("enrollment_code")) not in course_registrations:
+                AUDIT_LOG.info("Redemption of a invalid RegistrationCode %s", item.get("enrollment_code"))
+                if is_ratelimited(
+                    request, key="user", group="enrollment-codes.enroll-user", rate="6/m", increment=True
+                ):
+                    raise Ratelimited()
+
+        courses = {}
+        results = [self._redeem_item(item, users, course_registrations, courses) for item in items]
+        return Response(data={"results": results}, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _lookup_key(value):
+        """
+        Return the key of an email or enrollment code in the dicts of found users and codes.
+        """
+        return value.lower() if isinstance(value, str) else value
+
+    def _redeem_item(self, item, users, course_registrations, courses):
+        """
+        Redeem the enrollment code of an item for its user, and return the result of the item.
+
+        `courses` caches the redemption info of the courses across items, None for a course not found.
+        """
+        email = item.get("email")
+        enrollment_code = item.get("enrollment_code")
+        user = users.get(self._lookup_key(email))
+        course_registration = course_registrations.get(self._lookup_key(enrollment_code))
+        if course_registration is None:
+            error_reason = "Enrollment code not found"
+        elif user is None:
+            error_reason = "User not found"
+        else:
+            course_key = course_registration.course_id
+            if course_key not in courses:
+                try:
+                    courses[course_key] = get_course_redemption_info(course_key)
+                except Http404:
+                    courses[course_key] = None
+            course_info = courses[course_key]
+            if course_info is None:
+                error_reason = "Course not found"
+            else:
+                mode_slug = course_registration.mode_slug
+                error_reason = redeem_registration_code(
+                    user,
+                    course_registration,
+                    CourseKey.from_string(course_info["course_id"]),
+                    mode_slug is None or mode_slug in course_info["mode_slugs"],
+                )
+        result = {"email": email, "enrollment_code": enrollment_code, "success": error_reason is None}
+        if error_reason is not None:
+            result["reason"] = error_reason
+        return result
+
+
 class EnrollmentCodeStatusView(APIView):
     """
     This endpoint controls the status of the enrollment codes. Receives two parameters:
@@ -527,54 +1106,57 @@ class EnrollmentCodeStatusView(APIView):
         code = request.data.get("enrollment_code")
         action = request.data.get("action")
         try:
-            registration_code = CourseRegistrationCode.objects.get(code=code)
+            registration_code, redemptions = get_reg_code_redemptions(code)
         except CourseRegistrationCode.DoesNotExist:
             return Response(
                 data={"reason": "The enrollment code ({code}) was not found".format(code=code), "success": False},
                 status=400,
             )
-        # check if the code was in use (redeemed)
-        redemption = RegistrationCodeRedemption.get_registration_code_redemption(
-            registration_code.code, registration_code.course_id
-        )
-        if action == "cancel":
-            if redemption:
-                # if was redeemed, unenroll the user from the course and delete the
-                # redemption object.
-                CourseEnrollment.unenroll(redemption.course_enrollment.user, registration_code.course_id)
-                redemption.delete()
-            # make the enrollment code unavailable
-            registration_code.is_valid = False
-            registration_code.save()
-
-        if action == "restore":
-            if redemption:
-                # if was redeemed, unenroll the user from the course and delete the
-                # redemption object.
-                CourseEnrollment.unenroll(redemption.course_enrollment.user, registration_code.course_id)
-                redemption.delete()
-            # make the enrollment code available
-            registration_code.is_valid = True
-            registration_code.save()
+        if action in ("cancel", "restore"):
+            if redemptions:
+                # if was redeemed, unenroll the users from the course and delete every
+                # redemption object of the code.
+                for redemption in redemptions:
+                    if redemption.course_enrollment:
+                        CourseEnrollment.unenroll(redemption.course_enrollment.user, registration_code.course_id)
+                    redemption.delete()
+            # cancel makes the enrollment code unavailable, restore makes it available
+            registration_code.is_valid = action == "restore"
+            registration_code.save(update_fields=["is_valid"])
         return Response(data={"success": True})
 
 
 class GetBatchUserDataView(APIView):
     authentication_classes = (BearerAuthenticationAllowInactiveUser,)
     permission_classes = (IsStaffOrOwner,)
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [JSONLinesRenderer, CSVRenderer]
+
+    fields = ("id", "username", "email", "is_active", "date_joined")
 
     def get(self, request):
         """
-        /appsembler_api/v0/analytics/accounts/batch[?time-parameter]
+        /appsembler_api/v0/analytics/accounts/batch[?time-parameter&format-parameter&paging-parameter]
 
         time-parameter is an optional query parameter of:
             ?updated_min=yyyy-mm-ddThh:mm:ss
             ?updated_max=yyyy-mm-ddThh:mm:ss
             ?updated_min=yyyy-mm-ddThh:mm:ss&updated_max=yyyy-mm-ddThh:mm:ss
+        format-parameter is an optional query parameter of:
+            ?format=jsonl
+            ?format=csv
+            streams the users as JSON Lines or CSV instead of returning a single JSON list,
+            starting after the cursor if one is given.
+        paging-parameter is an optional query parameter of:
+            ?page_size=n[&cursor=next_cursor]
+            returns {"results": [...], "next_cursor": ..., "has_more": ...},
+            ordered by id
+            page_size cannot be combined with a format-parameter.
 
         """
         updated_min = request.GET.get("updated_min", "")
         updated_max = request.GET.get("updated_max", "")
+        page_size = request.GET.get("page_size")
+        cursor = request.GET.get("cursor")
 
         users = User.objects.all()
         if updated_min:
@@ -585,22 +1167,51 @@ class GetBatchUserDataView(APIView):
             max_date = parser.parse(updated_max)
             users = users.filter(date_joined__lt=max_date)
 
-        user_list = []
-        for user in users:
-            user_data = {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "is_active": user.is_active,
-                "date_joined": user.date_joined,
-            }
-            user_list.append(user_data)
+        # the accounts are ordered by id, which unlike date_joined is indexed, and follows the creation order
+        users = users.values(*self.fields).order_by("id")
+        renderer = request.accepted_renderer
+        streamed = isinstance(renderer, (JSONLinesRenderer, CSVRenderer))
+        if streamed and page_size:
+            return Response({"error": "page_size cannot be combined with format"}, status=400)
+        if page_size or (cursor and not streamed):
+            return self._get_page(users, page_size, cursor)
 
-        return Response(user_list, status=200)
+        chunk_size = getattr(settings, "APPSEMBLER_API_BATCH_CHUNK_SIZE", 2000)
+        try:
+            rows = iter_cursor_pages([users], None, chunk_size, self._user_key, cursor)
+        except ValueError as err:
+            return Response({"error": str(err)}, status=400)
+
+        if isinstance(renderer, JSONLinesRenderer):
+            return StreamingHttpResponse(renderer.stream(rows), content_type=renderer.media_type)
+        if isinstance(renderer, CSVRenderer):
+            return StreamingHttpResponse(renderer.stream(rows, self.fields), content_type=renderer.media_type)
+
+        return Response(list(rows), status=200)
+
+    def _get_page(self, users, page_size, cursor):
+        """
+        Return the response with the page of users following the cursor, ordered by id.
+        """
+        try:
+            page, next_cursor, has_more = get_cursor_page(
+                [users], None, cursor, get_batch_page_size(page_size), self._user_key
+            )
+        except ValueError as err:
+            return Response({"error": str(err)}, status=400)
+
+        return Response({"results": page, "next_cursor": next_cursor, "has_more": has_more}, status=200)
+
+    @staticmethod
+    def _user_key(user):
+        """
+        Return the id only keyset position of a user row.
+        """
+        return None, user["id"]
 
 
 @view_auth_classes(is_authenticated=False)
-class CourseListSearchView(DeveloperErrorViewMixin, ListAPIView):
+class CourseListSearchView(InstrumentedViewMixin, DeveloperErrorViewMixin, ListAPIView):
     """
     **Use Cases**
 
@@ -673,44 +1284,144 @@ class CourseListSearchView(DeveloperErrorViewMixin, ListAPIView):
 
     pagination_class = NamespacedPageNumberPagination
     serializer_class = CourseSerializer
-
-    # Return all the results, 10K is the maximum allowed value for ElasticSearch.
-    # We should use 0 after upgrading to 1.1+:
-    #   - https://github.com/elastic/elasticsearch/commit/8b0a863d427b4ebcbcfb1dcd69c996c52e7ae05e
+    # Elasticsearch refuses to page past its index.max_result_window, 10000 by default
     results_size_infinity = 10000
 
     def get_queryset(self):
         """
         Return a list of courses visible to the user.
+
+        The search results are read in chunks of APPSEMBLER_API_COURSE_SEARCH_CHUNK_SIZE courses, and each chunk
+        is loaded from the database with the visibility filters applied. The returned sequence is lazy, so only
+        the chunks needed to fill the requested page are searched and loaded, and at most
+        APPSEMBLER_API_COURSE_SEARCH_MAX_CHUNKS chunks are searched per request.
         """
         form = CourseListGetAndSearchForm(self.request.query_params, initial={"requesting_user": self.request.user})
         if not form.is_valid():
             raise ValidationError(form.errors)
 
-        courses_db = list_courses(
-            self.request,
-            form.cleaned_data["username"],
-            org=form.cleaned_data["org"],
-            filter_=form.cleaned_data["filter_"],
+        chunk_size = getattr(settings, "APPSEMBLER_API_COURSE_SEARCH_CHUNK_SIZE", 100)
+        cache_timeout = getattr(settings, "APPSEMBLER_API_COURSE_SEARCH_CACHE_TIMEOUT", 60)
+        cache_key = None
+        search_state = None
+        if cache_timeout:
+            # Checks the requesting user may list the courses of the user, like list_courses does, before the
+            # cached course ids of that user are read.
+            effective_user = get_effective_user(self.request.user, form.cleaned_data["username"])
+            cache_key = get_course_search_cache_key(form.cleaned_data, effective_user, get_current_site())
+            search_state = cache.get(cache_key)
+
+        first_chunk = None
+        if search_state is None:
+            with timed("search"):
+                first_chunk = search.api.course_discovery_search(form.cleaned_data["search_term"], size=chunk_size)
+            if not first_chunk["results"]:
+                return []
+            search_state = {"course_ids": [], "offset": 0, "total": first_chunk["total"]}
+
+        chunks = itertools.islice(
+            self._iter_visible_chunks(form.cleaned_data, chunk_size, search_state["offset"], first_chunk),
+            max(1, getattr(settings, "APPSEMBLER_API_COURSE_SEARCH_MAX_CHUNKS", 10)),
         )
+        found, searched = len(search_state["course_ids"]), search_state["offset"]
+        if first_chunk is not None:
+            # every page needs the first chunk, which is read now to know its share of visible courses
+            first_visible_chunk = next(chunks)
+            chunks = itertools.chain([first_visible_chunk], chunks)
+            courses, searched, __ = first_visible_chunk
+            found = len(courses)
+        courses = self._iter_courses(chunk_size, search_state, chunks, cache_key)
+        return LazySequence(courses, est_len=self._estimate_count(found, searched, search_state["total"]))
+
+    def _estimate_count(self, found, searched, total):
+        """
+        Estimate the number of visible courses from the `found` visible courses of the first `searched` of
+        `total` search results, assuming the results left have the same share of visible courses.
+        """
+        search_end = min(total, self.results_size_infinity)
+        if searched >= search_end:
+            return found
+        return found + max(1, math.ceil((search_end - searched) * found / searched))
 
-        courses_search = search.api.course_discovery_search(
-            form.cleaned_data["search_term"],
-            size=self.results_size_infinity,
-        )
+    def _iter_courses(self, chunk_size, search_state, chunks, cache_key):
+        """
+        Yield the courses visible to the user: first the ones of the cached search state, then the ones
+        of the `chunks` of search results past its offset.
 
-        course_search_ids = {course["data"]["id"]: True for course in courses_search["results"]}
+        The search state holds the ids of the visible courses found so far, the offset of the next search
+        results and their total. It is cached under `cache_key`, if any, after each chunk of search results,
+        so the next requests for the same search only search past the results this request read.
+        """
+        course_ids = list(search_state["course_ids"])
+        yield from self._iter_courses_by_id(course_ids, chunk_size)
+        for courses, offset, total in chunks:
+            course_ids.extend(str(course.id) for course in courses)
+            if cache_key:
+                cache.set(
+                    cache_key,
+                    {"course_ids": course_ids, "offset": offset, "total": total},
+                    getattr(settings, "APPSEMBLER_API_COURSE_SEARCH_CACHE_TIMEOUT", 60),
+                )
+            yield from courses
 
-        return [course for course in courses_db if str(course.id) in course_search_ids]
+    def _iter_courses_by_id(self, course_ids, chunk_size):
+        """
+        Yield the CourseOverview of each course id, loading them chunk by chunk.
+        """
+        for start in range(0, len(course_ids), chunk_size):
+            course_keys = [CourseKey.from_string(course_id) for course_id in course_ids[start : start + chunk_size]]
+            courses = CourseOverview.objects.in_bulk(course_keys)
+            yield from (courses[course_key] for course_key in course_keys if course_key in courses)
+
+    def _iter_visible_chunks(self, cleaned_data, chunk_size, offset, courses_search=None):
+        """
+        Yield a (visible courses, offset of the next search results, total search results) tuple for each
+        chunk of search results from `offset` on. `courses_search` is the chunk at `offset`, if already read.
+        """
+        while True:
+            if courses_search is None:
+                with timed("search"):
+                    courses_search = search.api.course_discovery_search(
+                        cleaned_data["search_term"],
+                        size=min(chunk_size, self.results_size_infinity - offset),
+                        from_=offset,
+                    )
+            if not courses_search["results"]:
+                return
+
+            course_keys = []
+            for course in courses_search["results"]:
+                try:
+                    course_keys.append(CourseKey.from_string(course["data"]["id"]))
+                except InvalidKeyError:
+                    log.warning("Skipping search result with an invalid course id: %s", course["data"]["id"])
+            courses = []
+            if course_keys:
+                courses = list(
+                    list_courses(
+                        self.request,
+                        cleaned_data["username"],
+                        org=cleaned_data["org"],
+                        filter_=cleaned_data["filter_"],
+                        course_keys=course_keys,
+                    )
+                )
+
+            offset += len(courses_search["results"])
+            yield courses, offset, courses_search["total"]
+            if offset >= min(courses_search["total"], self.results_size_infinity):
+                return
+            courses_search = None
 
 
-class GetBatchEnrollmentDataView(APIView):
+class GetBatchEnrollmentDataView(InstrumentedViewMixin, APIView):
     authentication_classes = (BearerAuthenticationAllowInactiveUser,)
     permission_classes = (IsStaffOrOwner,)
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [JSONLinesRenderer]
 
     def get(self, request):  # pylint: disable=too-many-locals
         """
-        /appsembler_api/v0/analytics/accounts/batch[?course_id=course_slug&time-parameter]
+        /appsembler_api/v0/analytics/accounts/batch[?course_id=course_slug&time-parameter&paging-parameter]
 
         course_slug an optional query parameter; if specified will only show enrollments
             for that particular course. The course_id need to be URL encoded, so:
@@ -721,12 +1432,22 @@ class GetBatchEnrollmentDataView(APIView):
                 ?updated_min=yyyy-mm-ddThh:mm:ss
                 ?updated_max=yyyy-mm-ddThh:mm:ss
                 ?updated_min=yyyy-mm-ddThh:mm:ss&updated_max=yyyy-mm-ddThh:mm:ss
+        paging-parameter is an optional, opt-in query parameter of:
+                ?format=jsonl[&cursor=next_cursor]
+                    streams every enrollment (after the cursor) as one JSON object per line
+                ?page_size=n[&cursor=next_cursor]
+                    returns {"results": [...], "next_cursor": ..., "has_more": ...},
+                    ordered by (date_enrolled, enrollment_id)
+                page_size cannot be combined with format=jsonl.
+        Without a paging-parameter the whole list is returned, as before.
         """
 
         updated_min = request.GET.get("updated_min", "")
         updated_max = request.GET.get("updated_max", "")
         course_id = request.GET.get("course_id")
         username = request.GET.get("username")
+        page_size = request.GET.get("page_size")
+        cursor = request.GET.get("cursor")
 
         enrollment_query_filter = {}
         cert_query_filter = {}
@@ -754,32 +1475,111 @@ class GetBatchEnrollmentDataView(APIView):
             enrollment_query_filter["created__lt"] = max_date
             cert_query_filter["created_date__lt"] = max_date
 
-        user_ids_with_certs = GeneratedCertificate.objects.filter(**cert_query_filter).values("user_id")
+        # Enrollments matching the filters and enrollments of users with a matching certificate are
+        # fetched as two separately ordered queries and merged, instead of OR-ing an IN subquery
+        # into a single query, which keeps MySQL from using an index on student_courseenrollment.
+        # Without any filter the first query already returns every enrollment.
+        enrollment_querysets = [CourseEnrollment.objects.filter(**enrollment_query_filter)]
+        if enrollment_query_filter:
+            user_ids_with_certs = GeneratedCertificate.objects.filter(**cert_query_filter).values("user_id")
+            enrollment_querysets.append(CourseEnrollment.objects.filter(user_id__in=user_ids_with_certs))
+        # created is nullable, and enrollments without a date cannot be ordered, merged or used as a cursor
+        enrollment_querysets = [
+            queryset.filter(created__isnull=False).select_related("user").order_by("created", "id")
+            for queryset in enrollment_querysets
+        ]
+        chunk_size = getattr(settings, "APPSEMBLER_API_BATCH_CHUNK_SIZE", 2000)
 
-        enrollments = CourseEnrollment.objects.filter(Q(user_id__in=user_ids_with_certs) | Q(**enrollment_query_filter))
+        renderer = request.accepted_renderer
+        if isinstance(renderer, JSONLinesRenderer):
+            if page_size:
+                return Response({"error": "page_size cannot be combined with format"}, status=400)
+            try:
+                enrollments = iter_cursor_pages(
+                    enrollment_querysets, "created", chunk_size, self._enrollment_key, cursor
+                )
+            except ValueError as err:
+                return Response({"error": str(err)}, status=400)
+            rows = self._iter_enrollment_data(request, enrollments, chunk_size)
+            return StreamingHttpResponse(renderer.stream(rows), content_type=renderer.media_type)
 
-        enrollment_list = []
-        for enrollment in enrollments:
-            enrollment_data = {
-                "enrollment_id": enrollment.id,
-                "user_id": enrollment.user.id,
-                "username": enrollment.user.username,
-                "course_id": str(enrollment.course_id),
-                "date_enrolled": enrollment.created,
-            }
+        if page_size or cursor:
             try:
-                cert = GeneratedCertificate.objects.get(course_id=enrollment.course_id, user=enrollment.user)
-                enrollment_data["certificate"] = {
-                    "completion_date": str(cert.created_date),
-                    "grade": cert.grade,
-                    "url": "{}/certificates/{}".format(
-                        request._request._current_scheme_host,  # pylint: disable=protected-access
-                        cert.verify_uuid,
-                    ),
-                }
-            except GeneratedCertificate.DoesNotExist:
-                pass
-
-            enrollment_list.append(enrollment_data)
+                page, next_cursor, has_more = get_cursor_page(
+                    enrollment_querysets, "created", cursor, get_batch_page_size(page_size), self._enrollment_key
+                )
+            except ValueError as err:
+                return Response({"error": str(err)}, status=400)
+
+            with timed("serialize"):
+                results = list(self._iter_enrollment_data(request, page, chunk_size))
+            return Response(
+                {
+                    "results": results,
+                    "next_cursor": next_cursor,
+                    "has_more": has_more,
+                },
+                status=200,
+            )
+
+        enrollments = merge_ordered_rows(
+            [queryset.iterator(chunk_size=chunk_size) for queryset in enrollment_querysets], self._enrollment_key
+        )
+        with timed("serialize"):
+            enrollment_list = list(self._iter_enrollment_data(request, enrollments, chunk_size))
 
         return Response(enrollment_list, status=200)
+
+    @staticmethod
+    def _enrollment_key(enrollment):
+        """
+        Return the (created, id) keyset position of an enrollment.
+        """
+        return enrollment.created, enrollment.id
+
+    def _iter_enrollment_data(self, request, enrollments, chunk_size):
+        """
+        Yield the analytics representation of each enrollment.
+
+        The enrollments are consumed in chunks, and the certificates of every chunk are
+        loaded with a single query, so the number of queries does not grow with each row.
+        """
+        enrollments = iter(enrollments)
+        while True:
+            chunk = list(itertools.islice(enrollments, chunk_size))
+            if not chunk:
+                return
+            certificates = {
+                (cert.user_id, cert.course_id): cert
+                for cert in GeneratedCertificate.objects.filter(
+                    user_id__in={enrollment.user_id for enrollment in chunk},
+                    course_id__in={enrollment.course_id for enrollment in chunk},
+                ).only("user_id", "course_id", "created_date", "grade", "verify_uuid")
+            }
+            for enrollment in chunk:
+                yield self._serialize_enrollment(
+                    request, enrollment, certificates.get((enrollment.user_id, enrollment.course_id))
+                )
+
+    def _serialize_enrollment(self, request, enrollment, cert):
+        """
+        Build the analytics representation of a single enrollment and its certificate, if any.
+        """
+        enrollment_data = {
+            "enrollment_id": enrollment.id,
+            "user_id": enrollment.user.id,
+            "username": enrollment.user.username,
+            "course_id": str(enrollment.course_id),
+            "date_enrolled": enrollment.created,
+        }
+        if cert is not None:
+            enrollment_data["certificate"] = {
+                "completion_date": str(cert.created_date),
+                "grade": cert.grade,
+                "url": "{}/certificates/{}".format(
+                    request._request._current_scheme_host,  # pylint: disable=protected-access
+                    cert.verify_uuid,
+                ),
+            }
+
+        return enrollment_data